@@ -52,3 +52,12 @@ class TypesDC:
 @dataclass
 class ConnectionsDC:
     conns: list[NodeConnectionDC]
+
+
+@dataclass
+class ChangeDC:
+    id: int
+    entity: str
+    entity_id: int
+    action: str
+    created_time: datetime
@@ -9,7 +9,7 @@ from sqlalchemy import (
 )
 from sqlalchemy.orm import relationship
 from app.base.db import db
-from app.map.dataclasses import NodeDC, NodetypeDC, NodeConnectionDC
+from app.map.dataclasses import NodeDC, NodetypeDC, NodeConnectionDC, ChangeDC
 
 
 class NodeModel(db):
@@ -116,3 +116,22 @@ class ConnectionModel(db):
             time=self.time,
             t_weight=self.t_weight,
         )
+
+
+class ChangeModel(db):
+    __tablename__ = "map_change"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String, nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    action = Column(String, nullable=False)
+    created_time = Column(DateTime, nullable=False)
+
+    def to_dc(self) -> ChangeDC:
+        return ChangeDC(
+            id=self.id,
+            entity=self.entity,
+            entity_id=self.entity_id,
+            action=self.action,
+            created_time=self.created_time,
+        )
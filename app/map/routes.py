@@ -1,6 +1,19 @@
 from app.web.app import Application
 
-from app.map.views import ConnectionView, NodeView, NavigateView, TypeView, StartView
+from app.map.views import (
+    ConnectionView,
+    ExportView,
+    ImportView,
+    NodeView,
+    NavigateView,
+    NavigateBatchView,
+    NavigateNearestView,
+    NearestView,
+    ReadyView,
+    TypeView,
+    StartView,
+    StatsView,
+)
 
 
 def register_urls(application: Application):
@@ -11,5 +24,12 @@ def register_urls(application: Application):
     application.router.add_view("/map/node/{node_id}", NodeView)
     application.router.add_view("/map/type/", TypeView)
     application.router.add_view("/map/type/{type_id}", TypeView)
+    application.router.add_view("/map/export", ExportView)
+    application.router.add_view("/map/import", ImportView)
     application.router.add_view("/map/navigate", NavigateView)
+    application.router.add_view("/map/navigate/batch", NavigateBatchView)
+    application.router.add_view("/map/navigate/nearest", NavigateNearestView)
+    application.router.add_view("/map/nearest", NearestView)
     application.router.add_view("/map/start", StartView)
+    application.router.add_view("/map/stats", StatsView)
+    application.router.add_view("/health/ready", ReadyView)
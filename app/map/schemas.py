@@ -46,3 +46,47 @@ class UpdConnSchema(Schema):
     distance = fields.Float(requred=False)
     time = fields.Float(requred=False)
     t_weight = fields.Float(requred=False)
+
+
+class ImportNodeSchema(Schema):
+    ref = fields.Str(required=True)
+    parent_ref = fields.Str(required=False)
+    parent_id = fields.Int(required=False)
+    name = fields.Str(required=True)
+    shortname = fields.Str(required=True)
+    description = fields.Str(required=False)
+    type_id = fields.Int(required=True)
+    x = fields.Float(required=True)
+    y = fields.Float(required=True)
+    z = fields.Float(required=True)
+
+
+class ImportConnSchema(Schema):
+    ref = fields.Str(required=False)
+    node1_ref = fields.Str(required=False)
+    node1_id = fields.Int(required=False)
+    node2_ref = fields.Str(required=False)
+    node2_id = fields.Int(required=False)
+    distance = fields.Float(required=True)
+    time = fields.Float(required=True)
+    t_weight = fields.Float(required=True)
+
+
+class ImportSchema(Schema):
+    nodes = fields.List(fields.Nested(ImportNodeSchema), required=True)
+    conns = fields.List(fields.Nested(ImportConnSchema), required=False)
+
+
+class NavigatePairSchema(Schema):
+    start_id = fields.Int(required=True)
+    target_id = fields.Int(required=True)
+
+
+class NavigateBatchSchema(Schema):
+    pairs = fields.List(fields.Nested(NavigatePairSchema), required=True)
+    cost = fields.Str(required=False)
+    w_distance = fields.Float(required=False)
+    w_time = fields.Float(required=False)
+    w_effort = fields.Float(required=False)
+    profile = fields.Str(required=False)
+    wait = fields.Float(required=False)
@@ -1,9 +1,14 @@
+import json
+import time
+
+from aiohttp.web import StreamResponse
 from aiohttp.web_exceptions import (
     HTTPForbidden,
     HTTPUnauthorized,
     HTTPBadRequest,
     HTTPNotFound,
-    HTTPServiceUnavailable
+    HTTPServiceUnavailable,
+    HTTPGatewayTimeout,
 )
 from aiohttp_apispec import (
     request_schema,
@@ -11,9 +16,11 @@ from aiohttp_apispec import (
 
 from aiohttp_cors import CorsViewMixin
 from app.web.app import View
-from app.web.utils import json_response
+from app.web.utils import json_response, error_json_response
 
 from app.map.schemas import (
+    ImportSchema,
+    NavigateBatchSchema,
     NewConnSchema,
     NewNodeSchema,
     NewTypeSchema,
@@ -21,25 +28,154 @@ from app.map.schemas import (
     UpdNodeSchema,
     UpdTypeSchema,
 )
+from app.map_module.cost import CostModel, cost_model
+from app.map_module.dataclasses import Lift_Weight
+from app.map_module.executor import RouteQueueFull, RouteTimeout
 from app.user.dataclasses import KEY_TYPES
 
 
+def parse_cost(params, profiles: dict) -> CostModel:
+    try:
+        model = cost_model(
+            params.get("cost"),
+            distance=float(params.get("w_distance", 0.0)),
+            time=float(params.get("w_time", 0.0)),
+            t_weight=float(params.get("w_effort", 0.0)),
+        )
+    except (TypeError, ValueError):
+        model = None
+    if model is None:
+        raise HTTPBadRequest(reason="Неверная функция стоимости маршрута")
+    if params.get("profile") is not None:
+        if params["profile"] not in profiles:
+            raise HTTPBadRequest(reason="Неизвестный профиль маршрута")
+        model = model.profiled(profiles[params["profile"]])
+    return model
+
+
+def parse_point(params, prefix: str) -> int | tuple[float, float, float]:
+    if f"{prefix}_id" in params:
+        return int(params[f"{prefix}_id"])
+    return (
+        float(params[f"{prefix}_x"]),
+        float(params[f"{prefix}_y"]),
+        float(params.get(f"{prefix}_z", 0.0)),
+    )
+
+
+async def locate(navigator, point: int | tuple[float, float, float]) -> int:
+    if isinstance(point, int):
+        return point
+    found = await navigator.nearest_point(*point, 1)
+    if not found:
+        raise HTTPNotFound(reason="Рядом с указанной точкой нет зон")
+    return found[0]["node"].id
+
+
+def import_levels(nodes: list[dict]) -> list[list[dict]]:
+    by_ref = dict()
+    for node in nodes:
+        if node["ref"] in by_ref:
+            raise HTTPBadRequest(reason="Повторяющийся временный идентификатор")
+        by_ref[node["ref"]] = node
+    depth = dict()
+    for node in nodes:
+        chain = [node]
+        while chain[-1]["ref"] not in depth and chain[-1].get("parent_ref"):
+            if chain[-1]["parent_ref"] not in by_ref:
+                raise HTTPBadRequest(reason="Неизвестный временный идентификатор")
+            if len(chain) > len(nodes):
+                raise HTTPBadRequest(reason="Циклическая вложенность зон")
+            chain.append(by_ref[chain[-1]["parent_ref"]])
+        level = depth.setdefault(chain[-1]["ref"], 0)
+        for current in reversed(chain[:-1]):
+            level += 1
+            depth[current["ref"]] = level
+    levels = [list() for _ in range(max(depth.values(), default=-1) + 1)]
+    for node in nodes:
+        levels[depth[node["ref"]]].append(node)
+    return levels
+
+
+def export_object(entity: str, row) -> dict:
+    if entity == "node":
+        result = {
+            "ref": str(row.id),
+            "type_id": row.type_id,
+            "name": row.name,
+            "shortname": row.shortname,
+            "x": row.x_cord,
+            "y": row.y_cord,
+            "z": row.z_cord,
+        }
+        if row.parent_id is not None:
+            result["parent_ref"] = str(row.parent_id)
+        if row.description is not None:
+            result["description"] = row.description
+        return result
+    if entity == "connection":
+        return {
+            "ref": str(row.id),
+            "node1_ref": str(row.node1_id),
+            "node2_ref": str(row.node2_id),
+            "distance": row.distance,
+            "time": row.time,
+            "t_weight": row.t_weight,
+        }
+    return row._asdict()
+
+
+async def require_navigator(request, wait) -> None:
+    navigator = request.app.store.map
+    if navigator.working:
+        return None
+    try:
+        wait = min(float(wait), request.app.config.map.ready_wait)
+    except (TypeError, ValueError):
+        raise HTTPBadRequest(reason="Неверный параметр")
+    if wait > 0 and await navigator.wait_ready(wait):
+        return None
+    if request.app.config.map.navigate_fallback != "start":
+        raise HTTPServiceUnavailable(reason="Модуль навигации еще не запущен. Запустите навигатор и попробуйте снова.")
+    await navigator.ensure_started()
+    return None
+
+
 class NavigateView(CorsViewMixin, View):
     async def get(self):
-        if not self.store.map.working:
-            raise HTTPServiceUnavailable(reason="Модуль навигации еще не запущен. Запустите навигатор и попробуйте снова.")
+        started = time.perf_counter()
+        await require_navigator(self.request, self.request.query.get("wait", 0))
         try:
-            start_id = int(self.request.query.get("start_id"))
-            target_id = int(self.request.query.get("target_id"))
+            start = parse_point(self.request.query, "start")
+            target = parse_point(self.request.query, "target")
         except:
-            raise HTTPBadRequest(resaon="Не указаны необходимые параметры") 
-        if not start_id or not target_id:
-            raise HTTPBadRequest(resaon="Не указаны необходимые параметры")
-        start_node = await self.store.mapAPI.get_node_by_id(start_id)
-        target_node = await self.store.mapAPI.get_node_by_id(target_id)
-        if (start_node is None) or (target_node is None):
-            raise HTTPNotFound(resaon="Не существует указанной зоны")
-        route = await self.store.map.navigate_main(start_id, target_id)
+            raise HTTPBadRequest(reason="Не указаны необходимые параметры")
+        if not start or not target:
+            raise HTTPBadRequest(reason="Не указаны необходимые параметры")
+        model = parse_cost(self.request.query, self.store.map.profiles)
+        elevator = self.request.query.get("elevator", model.elevator)
+        if elevator not in (Lift_Weight.AVOID, Lift_Weight.ALLOW, Lift_Weight.PREFER):
+            raise HTTPBadRequest(reason="Неверный режим использования лифта")
+        try:
+            start_id = await locate(self.store.map, start)
+            target_id = await locate(self.store.map, target)
+        except RouteQueueFull:
+            raise HTTPServiceUnavailable(reason="Сервис навигации перегружен, попробуйте позже")
+        except RouteTimeout:
+            raise HTTPGatewayTimeout(reason="Превышено время построения маршрута")
+        if (start_id not in self.store.map.nodes) or (target_id not in self.store.map.nodes):
+            raise HTTPNotFound(reason="Не существует указанной зоны")
+        try:
+            route = await self.store.map.navigate_main(
+                start_id, target_id, model, elevator
+            )
+        except RouteQueueFull:
+            raise HTTPServiceUnavailable(reason="Сервис навигации перегружен, попробуйте позже")
+        except RouteTimeout:
+            raise HTTPGatewayTimeout(reason="Превышено время построения маршрута")
+        if route is None:
+            raise HTTPNotFound(reason="Маршрут между указанными зонами не найден")
+        self.store.map.navigate_latency.add(time.perf_counter() - started)
         return json_response(
             data={
                 "route": [
@@ -49,15 +185,259 @@ class NavigateView(CorsViewMixin, View):
         )
 
 
+class NavigateBatchView(CorsViewMixin, View):
+    @request_schema(NavigateBatchSchema)
+    async def post(self):
+        await require_navigator(self.request, self.data.get("wait", 0))
+        model = parse_cost(self.data, self.store.map.profiles)
+        pairs = dict.fromkeys(
+            (pair["start_id"], pair["target_id"]) for pair in self.data["pairs"]
+        )
+        if len(pairs) > self.request.app.config.map.navigate_batch_limit:
+            raise HTTPBadRequest(reason="Слишком много маршрутов в одном запросе")
+        groups = dict()
+        for start_id, target_id in pairs:
+            groups.setdefault(start_id, list()).append(target_id)
+
+        response = StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(self.request)
+        for start_id, target_ids in groups.items():
+            if start_id not in self.store.map.nodes:
+                for target_id in target_ids:
+                    await response.write(
+                        self.__line(start_id, target_id, None, "not_found")
+                    )
+                continue
+            known = list()
+            for target_id in target_ids:
+                if target_id in self.store.map.nodes:
+                    known.append(target_id)
+                else:
+                    await response.write(
+                        self.__line(start_id, target_id, None, "not_found")
+                    )
+            try:
+                async for target_id, route in self.store.map.navigate_many(
+                    start_id, list(known), model
+                ):
+                    known.remove(target_id)
+                    await response.write(
+                        self.__line(
+                            start_id, target_id, route, None if route else "no_route"
+                        )
+                    )
+            except (RouteQueueFull, RouteTimeout) as e:
+                error = "busy" if isinstance(e, RouteQueueFull) else "timeout"
+                for target_id in known:
+                    await response.write(self.__line(start_id, target_id, None, error))
+        await response.write_eof()
+        return response
+
+    @staticmethod
+    def __line(start_id: int, target_id: int, route, error: str | None) -> bytes:
+        line = {
+            "start_id": start_id,
+            "target_id": target_id,
+            "route": None
+            if route is None
+            else [{"id": route_node.id, "name": route_node.name} for route_node in route],
+        }
+        if error:
+            line["error"] = error
+        return json.dumps(line, ensure_ascii=False).encode() + b"\n"
+
+
+class NavigateNearestView(CorsViewMixin, View):
+    async def get(self):
+        await require_navigator(self.request, self.request.query.get("wait", 0))
+        try:
+            start_id = int(self.request.query.get("start_id"))
+            type_id = int(self.request.query.get("type_id"))
+            limit = int(self.request.query.get("k", 1))
+        except:
+            raise HTTPBadRequest(reason="Не указаны необходимые параметры")
+        model = parse_cost(self.request.query, self.store.map.profiles)
+        if limit < 1 or limit > self.request.app.config.map.nearest_limit:
+            raise HTTPBadRequest(reason="Неверный параметр")
+        if start_id not in self.store.map.nodes:
+            raise HTTPNotFound(reason="Не существует указанной зоны")
+        if type_id not in self.store.map.types:
+            raise HTTPNotFound(reason="Не существует указанного типа")
+        try:
+            results = await self.store.map.nearest_of_type(
+                start_id, type_id, limit, model
+            )
+        except RouteQueueFull:
+            raise HTTPServiceUnavailable(reason="Сервис навигации перегружен, попробуйте позже")
+        except RouteTimeout:
+            raise HTTPGatewayTimeout(reason="Превышено время построения маршрута")
+        return json_response(
+            data={
+                "results": [
+                    {
+                        "id": result["node"].id,
+                        "name": result["node"].name,
+                        "type_id": result["node"].type.id,
+                        "distance": result["distance"],
+                        "route": [
+                            {"id": route_node.id, "name": route_node.name}
+                            for route_node in result["route"]
+                        ],
+                    }
+                    for result in results
+                ]
+            }
+        )
+
+
+class NearestView(CorsViewMixin, View):
+    async def get(self):
+        await require_navigator(self.request, self.request.query.get("wait", 0))
+        try:
+            x = float(self.request.query["x"])
+            y = float(self.request.query["y"])
+            z = float(self.request.query.get("z", 0.0))
+            limit = int(self.request.query.get("k", 1))
+        except:
+            raise HTTPBadRequest(reason="Не указаны необходимые параметры")
+        if limit < 1 or limit > self.request.app.config.map.nearest_limit:
+            raise HTTPBadRequest(reason="Неверный параметр")
+        try:
+            results = await self.store.map.nearest_point(x, y, z, limit)
+        except RouteQueueFull:
+            raise HTTPServiceUnavailable(reason="Сервис навигации перегружен, попробуйте позже")
+        except RouteTimeout:
+            raise HTTPGatewayTimeout(reason="Превышено время построения маршрута")
+        return json_response(
+            data={
+                "results": [
+                    {
+                        "id": result["node"].id,
+                        "name": result["node"].name,
+                        "type_id": result["node"].type.id,
+                        "distance": result["distance"],
+                    }
+                    for result in results
+                ]
+            }
+        )
+
+
 class StartView(CorsViewMixin, View):
     async def post(self):
         if not self.store.map.working:
-            await self.store.map.start()
-            return json_response(data={"result": "Система навигации запущена успешно"})
+            await self.store.map.ensure_started()
+            return json_response(
+                data={
+                    "result": "Система навигации запущена успешно",
+                    "stats": self.store.map.load_stats,
+                }
+            )
         else:
             return json_response(data={"result": "Система навигации уже запущена"})
 
 
+class StatsView(CorsViewMixin, View):
+    async def get(self):
+        return json_response(
+            data={
+                "working": self.store.map.working,
+                "state": self.store.map.state,
+                "version": self.store.map.version,
+                "load": self.store.map.load_stats,
+                "route_cache": self.store.map.route_cache.stats(),
+                "navigate_latency": self.store.map.navigate_latency.stats(),
+                "expansions": self.store.map.expansions.stats(),
+                "executor": self.store.map.executor.stats(),
+            }
+        )
+
+
+class ReadyView(CorsViewMixin, View):
+    async def get(self):
+        if not self.store.map.working:
+            return error_json_response(
+                http_status=503,
+                status="service_unavailable",
+                message="Граф навигации загружается",
+                data=self.store.map.progress(),
+            )
+        return json_response(data=self.store.map.progress())
+
+
+class ImportView(CorsViewMixin, View):
+    @request_schema(ImportSchema)
+    async def post(self):
+        if self.request.user is None:
+            raise HTTPUnauthorized(reason="Вы не авторизованы")
+        user = self.request.user
+        acceses = await self.store.userAPI.get_user_accesses(user.id)
+        if acceses is None:
+            raise HTTPForbidden(reason="Доступ к ресурсу запрещен")
+        roles = [access.access_id.name for access in acceses.roles]
+        if (KEY_TYPES.ADMIN not in roles) and (KEY_TYPES.OWNER not in roles):
+            raise HTTPForbidden(reason="Доступ к ресурсу запрещен")
+        nodes = self.data["nodes"]
+        conns = self.data.get("conns", [])
+        if len(nodes) + len(conns) > self.request.app.config.map.import_limit:
+            raise HTTPBadRequest(reason="Слишком много объектов в одном запросе")
+        levels = import_levels(nodes)
+        refs = {node["ref"] for node in nodes}
+        for conn in conns:
+            for end in ("node1", "node2"):
+                if conn.get(f"{end}_ref"):
+                    if conn[f"{end}_ref"] not in refs:
+                        raise HTTPBadRequest(reason="Неизвестный временный идентификатор")
+                elif conn.get(f"{end}_id") is None:
+                    raise HTTPBadRequest(reason="Не указаны необходимые параметры")
+        result = await self.store.mapAPI.import_graph(user.id, levels, conns)
+        if result is None:
+            raise HTTPBadRequest(reason="Ошибка при импорте")
+        created, connections = result
+        if self.store.map.working:
+            await self.store.map.mutate(self.store.map.add_graph, list(created.values()), connections)
+        return json_response(
+            data={
+                "nodes": {ref: node.id for ref, node in created.items()},
+                "conns": [conn.id for conn in connections],
+            }
+        )
+
+
+class ExportView(CorsViewMixin, View):
+    async def get(self):
+        if self.request.user is None:
+            raise HTTPUnauthorized(reason="Вы не авторизованы")
+        acceses = await self.store.userAPI.get_user_accesses(self.request.user.id)
+        if acceses is None:
+            raise HTTPForbidden(reason="Доступ к ресурсу запрещен")
+        roles = [access.access_id.name for access in acceses.roles]
+        if (
+            (KEY_TYPES.ADMIN not in roles)
+            and (KEY_TYPES.OWNER not in roles)
+            and (KEY_TYPES.EDITOR not in roles)
+        ):
+            raise HTTPForbidden(reason="Доступ к ресурсу запрещен")
+        entity = self.request.query.get("entity")
+        if entity not in ("type", "node", "connection"):
+            raise HTTPBadRequest(reason="Неверный параметр")
+        try:
+            after = int(self.request.query.get("after", 0))
+        except ValueError:
+            raise HTTPBadRequest(reason="Неверный параметр")
+        response = StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(self.request)
+        async for row in self.store.mapAPI.export_rows(
+            entity, after, self.request.app.config.map.export_chunk
+        ):
+            await response.write(
+                json.dumps(export_object(entity, row), ensure_ascii=False).encode()
+                + b"\n"
+            )
+        await response.write_eof()
+        return response
+
+
 class TypeView(CorsViewMixin, View):
     async def get(self):
         try:
@@ -66,11 +446,13 @@ class TypeView(CorsViewMixin, View):
             page = int(self.request.query.get("page", 1))
             if page < 1:
                 raise HTTPBadRequest(resaon="Неверный параметр")
+            after = self.request.query.get("after")
+            after = None if after is None else int(after)
             unlimited = int(self.request.query.get("unlimited", 0))
             if unlimited == 1:
                 types = await self.store.mapAPI.get_all_types(page=None,limit=None)
             else:
-                types = await self.store.mapAPI.get_all_types(page=page, limit=10)
+                types = await self.store.mapAPI.get_all_types(page=page, limit=10, after=after)
             if not types:
                 raise HTTPNotFound(resaon="Вы вышли за границы списка")
             return json_response(
@@ -118,7 +500,7 @@ class TypeView(CorsViewMixin, View):
         if new_type is None:
             raise HTTPBadRequest(resaon="Ошибка при создании")
         if self.store.map.working:
-            await self.store.map.add_type(new_type)
+            await self.store.map.mutate(self.store.map.add_type, new_type)
         return json_response(
             data={
                 "id": new_type.id,
@@ -162,7 +544,7 @@ class TypeView(CorsViewMixin, View):
         if upd_type is None:
             raise HTTPBadRequest("Ошибка при изменении")
         if self.store.map.working:
-            await self.store.map.change_type(upd_type)
+            await self.store.map.mutate(self.store.map.change_type, upd_type)
         return json_response(
             data={
                 "id": upd_type.id,
@@ -194,7 +576,7 @@ class TypeView(CorsViewMixin, View):
         if not result:
             raise HTTPBadRequest(resaon="Ошибка при удалении")
         if self.store.map.working:
-            await self.store.map.delete_type(type_id)
+            await self.store.map.mutate(self.store.map.delete_type, type_id)
         return json_response(data={"result": "Успешное удаление"})
 
 
@@ -206,6 +588,8 @@ class NodeView(CorsViewMixin, View):
             page = int(self.request.query.get("page", 1))
             if page < 1:
                 raise HTTPBadRequest(resaon="Неправильный парметр")
+            after = self.request.query.get("after")
+            after = None if after is None else int(after)
             node_type = int(self.request.query.get("type", 0))
             if node_type < 0:
                 raise HTTPBadRequest(resaon="Неправильный параметр")
@@ -220,7 +604,7 @@ class NodeView(CorsViewMixin, View):
             elif parent:
                 nodes = await self.store.mapAPI.get_all_children_nodes_of_node(parent)
             else:
-                nodes = await self.store.mapAPI.get_all_nodes(page=page, limit=10)
+                nodes = await self.store.mapAPI.get_all_nodes(page=page, limit=10, after=after)
             if not nodes:
                 raise HTTPNotFound(resaon="Вы вышли за пределы списка зон")
             try:
@@ -354,7 +738,7 @@ class NodeView(CorsViewMixin, View):
         if new_node is None:
             raise HTTPBadRequest(resaon="Ошибка при создании")
         if self.store.map.working:
-            await self.store.map.add_node(new_node)
+            await self.store.map.mutate(self.store.map.add_node, new_node)
         return json_response(
             data={
                 "id": new_node.id,
@@ -424,7 +808,7 @@ class NodeView(CorsViewMixin, View):
         if upd_node is None:
             raise HTTPBadRequest(resaon="Ошибка при обновлении")
         if self.store.map.working:
-            await self.store.map.change_node(upd_node)
+            await self.store.map.mutate(self.store.map.change_node, upd_node)
         return json_response(
             data={
                 "id": upd_node.id,
@@ -468,7 +852,7 @@ class NodeView(CorsViewMixin, View):
         if not result:
             raise HTTPBadRequest(resaon="Ошибка при удалении")
         if self.store.map.working:
-            await self.store.map.delete_node(node_id)
+            await self.store.map.mutate(self.store.map.delete_node, node_id)
         return json_response(data={"result": "Успешное удаление"})
 
 
@@ -480,6 +864,8 @@ class ConnectionView(CorsViewMixin, View):
             page = int(self.request.query.get("page", 1))
             if page < 1:
                 raise HTTPBadRequest(resaon="Неверный параметр")
+            after = self.request.query.get("after")
+            after = None if after is None else int(after)
             node = int(self.request.query.get("node", 0))
             if node < 0:
                 raise HTTPBadRequest(resaon="Неверный параметр")
@@ -489,7 +875,7 @@ class ConnectionView(CorsViewMixin, View):
             elif node:
                 conns = await self.store.mapAPI.get_all_connections_of_node(node)
             else:
-                conns = await self.store.mapAPI.get_all_connections(page=page, limit=10)
+                conns = await self.store.mapAPI.get_all_connections(page=page, limit=10, after=after)
             if not conns:
                 raise HTTPNotFound(resaon="Вы вышли за пределы списка соединений")
             return json_response(
@@ -615,7 +1001,7 @@ class ConnectionView(CorsViewMixin, View):
         if new_conn is None:
             raise HTTPBadRequest(resaon="Ошибка при создании")
         if self.store.map.working:
-            await self.store.map.add_conn(new_conn)
+            await self.store.map.mutate(self.store.map.add_conn, new_conn)
         return json_response(
             data={
                 "id":new_conn.id,
@@ -664,7 +1050,7 @@ class ConnectionView(CorsViewMixin, View):
         if upd_conn is None:
             raise HTTPBadRequest(resaon="Ошибка при изменении")
         if self.store.map.working:
-            await self.store.map.change_conn(upd_conn)
+            await self.store.map.mutate(self.store.map.change_conn, upd_conn)
         return json_response(
             data={
                 "id":upd_conn.id,
@@ -697,5 +1083,5 @@ class ConnectionView(CorsViewMixin, View):
         if not result:
             raise HTTPBadRequest(resaon="Ошибка при удалении")
         if self.store.map.working:
-            await self.store.map.delete_conn(conn_id,seacrh_conn.node1_id,seacrh_conn.node2_id)
+            await self.store.map.mutate(self.store.map.delete_conn, conn_id,seacrh_conn.node1_id,seacrh_conn.node2_id)
         return json_response(data={"result": "Успешное удаление"})
@@ -0,0 +1,77 @@
+import typing
+from array import array
+
+
+class AncestorTable:
+    """Building and floor of every graph index.
+
+    The building of a node is the node itself when it is a ``Korpus``, else
+    the building of its parent; its floor is the child of that building on
+    its parent chain. Both are -1 outside any building. A shared map attaches
+    the read-only snapshot sections instead of arrays of its own.
+    """
+
+    def __init__(self):
+        self.building = array("q")
+        self.floor = array("q")
+
+    def __grow(self, size: int) -> None:
+        missing = size - len(self.building)
+        if missing > 0:
+            self.building.extend([-1] * missing)
+            self.floor.extend([-1] * missing)
+        return None
+
+    def attach(self, building, floor) -> None:
+        self.building = building
+        self.floor = floor
+        return None
+
+    def add(
+        self, idx: int, node_id: int, parent_idx: int, parent_id: int, korpus: bool
+    ) -> None:
+        self.__grow(idx + 1)
+        if korpus:
+            building, floor = node_id, -1
+        elif parent_idx < 0:
+            building, floor = -1, -1
+        else:
+            building = self.building[parent_idx]
+            floor = node_id if building == parent_id else self.floor[parent_idx]
+        self.building[idx] = building
+        self.floor[idx] = floor
+        return None
+
+    def remove(self, idx: int) -> None:
+        if idx < len(self.building):
+            self.building[idx] = -1
+            self.floor[idx] = -1
+        return None
+
+    def building_of(self, idx: int) -> int:
+        return self.building[idx] if idx < len(self.building) else -1
+
+    def floor_of(self, idx: int) -> int:
+        return self.floor[idx] if idx < len(self.floor) else -1
+
+    def rebuild(self, graph, parent_of: typing.Callable[[int], int], korpus: int) -> None:
+        self.building = array("q")
+        self.floor = array("q")
+        self.__grow(len(graph.ids))
+        done = set()
+        for node_id in graph.index:
+            chain = [node_id]
+            while chain[-1] >= 0 and chain[-1] not in done:
+                chain.append(parent_of(chain[-1]))
+            for position in range(len(chain) - 2, -1, -1):
+                current = chain[position]
+                parent = chain[position + 1]
+                self.add(
+                    graph.index[current],
+                    current,
+                    graph.index[parent] if parent >= 0 else -1,
+                    parent,
+                    graph.kind[graph.index[current]] == korpus,
+                )
+                done.add(current)
+        return None
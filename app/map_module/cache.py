@@ -0,0 +1,88 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class RouteCache:
+    """LRU of finished routes; its own lock lets map edits running in a worker
+    thread invalidate entries while the event loop reads and fills it."""
+
+    def __init__(self, size: int, ttl: float):
+        self.lock = threading.RLock()
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.by_building = dict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires, _, route = entry
+            if expires < time.monotonic():
+                self.__drop(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return route
+
+    def put(self, key: tuple, route, buildings: set) -> None:
+        with self.lock:
+            if self.size <= 0:
+                return None
+            if key in self.entries:
+                self.__drop(key)
+            self.entries[key] = (time.monotonic() + self.ttl, buildings, route)
+            for building in buildings:
+                self.by_building.setdefault(building, set()).add(key)
+            while len(self.entries) > self.size:
+                self.__drop(next(iter(self.entries)))
+                self.evictions += 1
+            return None
+
+    def invalidate(self, buildings: set) -> None:
+        with self.lock:
+            for building in buildings:
+                for key in self.by_building.pop(building, ()):
+                    if key in self.entries:
+                        self.__drop(key)
+                        self.invalidations += 1
+            return None
+
+    def clear(self) -> None:
+        with self.lock:
+            self.invalidations += len(self.entries)
+            self.entries.clear()
+            self.by_building.clear()
+            return None
+
+    def __drop(self, key: tuple) -> None:
+        _, buildings, _ = self.entries.pop(key)
+        for building in buildings:
+            keys = self.by_building.get(building)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.by_building[building]
+        return None
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "capacity": self.size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,21 @@
+class ChangeSet:
+    """Cache invalidations of a group of edits, applied once by ``Map.batch``."""
+
+    def __init__(self):
+        self.buildings = set()
+        self.weighted = set()
+        self.structure = False
+        self.weights = False
+        self.street = False
+
+    def add(self, buildings: set, indices: list[int], street: bool, weights_only: bool):
+        self.buildings.update(buildings)
+        if weights_only:
+            self.weights = True
+            self.weighted.update(indices)
+        else:
+            self.structure = True
+        if street:
+            self.street = True
+            self.buildings.add(None)
+        return None
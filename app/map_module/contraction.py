@@ -0,0 +1,185 @@
+import heapq
+import math
+from array import array
+
+
+class ContractionIndex:
+    """Customizable contraction hierarchy over the nodes a search may cross.
+
+    The node order and the shortcut topology come from a minimum degree
+    elimination and do not depend on edge weights, so one index serves every
+    cost model. ``customize`` fills the shortcut weights of a model by
+    relaxing lower triangles in elimination order; weight changes and removed
+    edges only need a new customization, added edges or nodes need a rebuild.
+    """
+
+    def __init__(self, blocked: bytes):
+        self.blocked = blocked
+        self.rank = dict()
+        self.order = array("l")
+        self.up_offsets = array("l", [0])
+        self.up_target = array("l")
+        self.arcs = dict()
+        self.edges = dict()
+        self.weights = dict()
+        self.structure_dirty = True
+        self.weights_dirty = set()
+
+    def __contains__(self, idx: int) -> bool:
+        return idx in self.rank
+
+    def build(self, graph) -> None:
+        kind = graph.kind
+        blocked = self.blocked
+        neighbors = dict()
+        edges = dict()
+        for slot in range(len(graph.edge_ids)):
+            if graph.edge_ids[slot] < 0:
+                continue
+            u = graph.edge_u[slot]
+            v = graph.edge_v[slot]
+            if u == v or blocked[kind[u]] or blocked[kind[v]]:
+                continue
+            neighbors.setdefault(u, set()).add(v)
+            neighbors.setdefault(v, set()).add(u)
+            edges.setdefault((min(u, v), max(u, v)), list()).append(slot)
+
+        degree = [(len(adjacent), idx) for idx, adjacent in neighbors.items()]
+        heapq.heapify(degree)
+        rank = dict()
+        uppers = list()
+        while degree:
+            current_degree, idx = heapq.heappop(degree)
+            if idx in rank or current_degree != len(neighbors[idx]):
+                continue
+            rank[idx] = len(uppers)
+            adjacent = neighbors.pop(idx)
+            uppers.append(adjacent)
+            for neighbor in adjacent:
+                neighbors[neighbor].discard(idx)
+                neighbors[neighbor].update(adjacent)
+                neighbors[neighbor].discard(neighbor)
+            for neighbor in adjacent:
+                heapq.heappush(degree, (len(neighbors[neighbor]), neighbor))
+
+        self.rank = rank
+        self.order = array("l", [0]) * len(rank)
+        for idx, position in rank.items():
+            self.order[position] = idx
+        self.up_offsets = array("l", [0])
+        self.up_target = array("l")
+        self.arcs = dict()
+        for position, adjacent in enumerate(uppers):
+            for upper in sorted(rank[neighbor] for neighbor in adjacent):
+                self.arcs[position, upper] = len(self.up_target)
+                self.up_target.append(upper)
+            self.up_offsets.append(len(self.up_target))
+        self.edges = {
+            self.arcs[min(rank[u], rank[v]), max(rank[u], rank[v])]: slots
+            for (u, v), slots in edges.items()
+        }
+        self.weights = dict()
+        self.structure_dirty = False
+        self.weights_dirty = set()
+        return None
+
+    def customize(self, graph, model) -> tuple[array, array]:
+        weight = array("d", [math.inf]) * len(self.up_target)
+        middle = array("l", [-1]) * len(self.up_target)
+        for arc, slots in self.edges.items():
+            for slot in slots:
+                if graph.edge_ids[slot] < 0:
+                    continue
+                cost = model.slot_cost(graph, slot)
+                if cost < weight[arc]:
+                    weight[arc] = cost
+        up_offsets = self.up_offsets
+        up_target = self.up_target
+        arcs = self.arcs
+        for lower in range(len(up_offsets) - 1):
+            start = up_offsets[lower]
+            end = up_offsets[lower + 1]
+            for first in range(start, end):
+                head = weight[first]
+                if head == math.inf:
+                    continue
+                for second in range(first + 1, end):
+                    length = head + weight[second]
+                    arc = arcs[up_target[first], up_target[second]]
+                    if length < weight[arc]:
+                        weight[arc] = length
+                        middle[arc] = lower
+        self.weights[model.key] = (weight, middle)
+        self.weights_dirty.discard(model.key)
+        return weight, middle
+
+    def metric(self, graph, model) -> tuple[array, array]:
+        if model.key in self.weights and model.key not in self.weights_dirty:
+            return self.weights[model.key]
+        return self.customize(graph, model)
+
+    def invalidate_weights(self) -> None:
+        self.weights_dirty.update(self.weights)
+        return None
+
+    def query(
+        self, graph, model, source: int, target: int
+    ) -> tuple[float, list[int]] | None:
+        weight, middle = self.metric(graph, model)
+        source = self.rank[source]
+        target = self.rank[target]
+        up_offsets = self.up_offsets
+        up_target = self.up_target
+        best = ({source: 0.0}, {target: 0.0})
+        previous = ({source: -1}, {target: -1})
+        queues = ([(0.0, source)], [(0.0, target)])
+        length = math.inf
+        meeting = -1
+        while queues[0] or queues[1]:
+            side = (
+                0 if queues[0] and (not queues[1] or queues[0][0] <= queues[1][0]) else 1
+            )
+            distance, current = heapq.heappop(queues[side])
+            if distance > best[side][current]:
+                continue
+            if distance >= length:
+                queues[side].clear()
+                continue
+            other = best[1 - side].get(current)
+            if other is not None and distance + other < length:
+                length = distance + other
+                meeting = current
+            for arc in range(up_offsets[current], up_offsets[current + 1]):
+                upper = up_target[arc]
+                step = distance + weight[arc]
+                if step < best[side].get(upper, math.inf):
+                    best[side][upper] = step
+                    previous[side][upper] = current
+                    heapq.heappush(queues[side], (step, upper))
+        if meeting < 0:
+            return None
+        path = self.__chain(previous[0], meeting, middle)[::-1]
+        path += self.__chain(previous[1], meeting, middle)[1:]
+        return length, [self.order[position] for position in path]
+
+    def __chain(self, previous: dict, current: int, middle: array) -> list[int]:
+        result = [current]
+        while previous[current] != -1:
+            lower = previous[current]
+            result.extend(self.__unpack(current, lower, middle)[1:])
+            current = lower
+        return result
+
+    def __unpack(self, first: int, second: int, middle: array) -> list[int]:
+        result = [first]
+        stack = [second]
+        while stack:
+            current = stack.pop()
+            low, high = min(result[-1], current), max(result[-1], current)
+            via = middle[self.arcs[low, high]]
+            if via < 0:
+                result.append(current)
+            else:
+                stack.append(current)
+                stack.append(via)
+        return result
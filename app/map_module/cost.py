@@ -0,0 +1,99 @@
+import math
+import typing
+
+from app.map_module.dataclasses import Lift_Weight
+from app.map_module.graph import KIND_ELEVATOR
+
+if typing.TYPE_CHECKING:
+    from app.map_module.profiles import Profile
+
+
+class CostModel:
+
+    def __init__(
+        self,
+        name: str,
+        distance: float = 0.0,
+        time: float = 0.0,
+        t_weight: float = 0.0,
+        profile: "Profile | None" = None,
+        lift: float = 1.0,
+    ):
+        self.name = name
+        self.distance = distance
+        self.time = time
+        self.t_weight = t_weight
+        self.profile = profile
+        self.lift = lift
+        self.key = (
+            (distance, time, t_weight)
+            if profile is None
+            else (distance, time, t_weight, profile.name)
+        )
+        if lift != 1.0:
+            self.key += (("lift", lift),)
+
+    @property
+    def stamp(self) -> int:
+        return 0 if self.profile is None else self.profile.revision
+
+    @property
+    def elevator(self) -> str:
+        return Lift_Weight.AVOID if self.profile is None else self.profile.elevator
+
+    def cost(self, distance: float, time: float, t_weight: float) -> float:
+        return self.distance * distance + self.time * time + self.t_weight * t_weight
+
+    def slot_cost(self, graph, slot: int) -> float:
+        cost = self.cost(graph.distance[slot], graph.time[slot], graph.t_weight[slot])
+        if self.lift != 1.0 and (
+            graph.kind[graph.edge_u[slot]] == KIND_ELEVATOR
+            and graph.kind[graph.edge_v[slot]] == KIND_ELEVATOR
+        ):
+            cost *= self.lift
+        if self.profile is None:
+            return cost
+        factor = self.profile.edge_factor(graph.edge_u[slot], graph.edge_v[slot])
+        return math.inf if factor == math.inf else cost * factor
+
+    def profiled(self, profile: "Profile") -> "CostModel":
+        return CostModel(
+            f"{self.name}/{profile.name}",
+            distance=self.distance,
+            time=self.time,
+            t_weight=self.t_weight,
+            profile=profile,
+            lift=self.lift,
+        )
+
+    def lifted(self, elevator: str) -> "CostModel":
+        factor = Lift_Weight.FACTORS.get(elevator)
+        if factor is None or factor == self.lift:
+            return self
+        return CostModel(
+            f"{self.name}/{elevator}",
+            distance=self.distance,
+            time=self.time,
+            t_weight=self.t_weight,
+            profile=self.profile,
+            lift=factor,
+        )
+
+
+SHORTEST = CostModel("shortest", distance=1.0)
+FASTEST = CostModel("fastest", time=1.0)
+EFFORT = CostModel("effort", t_weight=1.0)
+
+MODELS = {model.name: model for model in (SHORTEST, FASTEST, EFFORT)}
+
+
+def cost_model(
+    name: str | None, distance: float = 0.0, time: float = 0.0, t_weight: float = 0.0
+) -> CostModel | None:
+    if name is None:
+        return SHORTEST
+    if name == "blend":
+        if min(distance, time, t_weight) < 0 or not (distance or time or t_weight):
+            return None
+        return CostModel("blend", distance=distance, time=time, t_weight=t_weight)
+    return MODELS.get(name)
@@ -3,9 +3,11 @@ class KEY_TYPES:
     STREET = "Улица"
     KORPUS = "Корпус"
     DOOR = "Дверь"
+    STAIRS = "Лестница"
 
 
 class Lift_Weight:
-    GUK = []
-    ULK = []
-    E = []
+    AVOID = "avoid"
+    ALLOW = "allow"
+    PREFER = "prefer"
+    FACTORS = {ALLOW: 1.0, PREFER: 0.5}
@@ -0,0 +1,152 @@
+import asyncio
+import multiprocessing
+import threading
+import typing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from logging import getLogger
+
+from app.web.config import MapConfig
+
+
+EXECUTOR_MODES = ("inline", "thread", "process")
+
+_snapshot = None
+
+
+class RouteQueueFull(Exception):
+    pass
+
+
+class RouteTimeout(Exception):
+    pass
+
+
+def _attach(snapshot) -> None:
+    global _snapshot
+    snapshot.lock = threading.RLock()
+    snapshot.route_cache.lock = threading.RLock()
+    _snapshot = snapshot
+
+
+def _call(method: str, *args):
+    return getattr(_snapshot, method)(*args)
+
+
+class RouteExecutor:
+    """Runs synchronous ``Map`` searches away from the event loop.
+
+    ``process`` workers are forked from a prepared map and route against that
+    read-only copy. Once the map version moves on, a new pool is prepared and
+    forked in a background thread under the map lock while the old one keeps
+    answering; it is swapped in when ready. ``run`` returns the map version an
+    answer was computed at, so callers can tell an answer of the old pool from
+    a current one. A queue slot is held until its search really finishes, also
+    after the caller has timed out.
+    """
+
+    def __init__(self, config: MapConfig):
+        if config.route_executor not in EXECUTOR_MODES:
+            raise ValueError(f"unknown route executor {config.route_executor!r}")
+        self.mode = config.route_executor
+        self.workers = config.route_workers
+        self.queue_size = config.route_queue_size
+        self.timeout = config.route_timeout
+        self.pool: Executor | None = None
+        self.snapshot_version = None
+        self.forking: asyncio.Task | None = None
+        self.pending = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.logger = getLogger("map.executor")
+
+    async def run(self, navigator, method: str, *args) -> tuple[typing.Any, int]:
+        if self.mode == "inline":
+            return getattr(navigator, method)(*args), navigator.version
+        if self.pending >= self.queue_size:
+            self.rejected += 1
+            raise RouteQueueFull()
+        self.pending += 1
+        try:
+            pool, version = await self.__pool(navigator)
+            if self.mode == "process":
+                call = (_call, method) + args
+            else:
+                call = (getattr(navigator, method),) + args
+            submitted = pool.submit(*call)
+        except BaseException:
+            self.pending -= 1
+            raise
+        loop = asyncio.get_running_loop()
+        submitted.add_done_callback(lambda _: loop.call_soon_threadsafe(self.__release))
+        future = asyncio.wrap_future(submitted)
+        try:
+            return (
+                await asyncio.wait_for(asyncio.shield(future), self.timeout),
+                version,
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            submitted.cancel()
+            future.add_done_callback(lambda done: done.cancelled() or done.exception())
+            raise RouteTimeout()
+
+    def __release(self) -> None:
+        self.pending -= 1
+        return None
+
+    async def __pool(self, navigator) -> tuple[Executor, int]:
+        if self.mode == "thread":
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="route"
+                )
+            return self.pool, navigator.version
+        stale = self.pool is None or self.snapshot_version != navigator.version
+        if stale and self.forking is None:
+            self.forking = asyncio.create_task(self.__refork(navigator))
+        if self.pool is None:
+            await asyncio.shield(self.forking)
+        return self.pool, self.snapshot_version
+
+    async def __refork(self, navigator) -> None:
+        try:
+            pool, version = await asyncio.to_thread(self.__fork, navigator)
+        finally:
+            self.forking = None
+        previous, self.pool = self.pool, pool
+        self.snapshot_version = version
+        if previous is not None:
+            previous.shutdown(wait=False)
+        self.logger.info("route workers forked at map version %d", version)
+        return None
+
+    def __fork(self, navigator) -> tuple[Executor, int]:
+        with navigator.lock:
+            navigator.prepare()
+            pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=_attach,
+                initargs=(navigator,),
+            )
+            pool.submit(int).result()
+            return pool, navigator.version
+
+    async def shutdown(self, *_: list, **__: dict) -> None:
+        if self.forking is not None:
+            self.forking.cancel()
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "workers": self.workers if self.mode != "inline" else 0,
+            "pending": self.pending,
+            "queue_size": self.queue_size,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "snapshot_version": self.snapshot_version,
+        }
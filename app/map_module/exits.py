@@ -0,0 +1,31 @@
+class ExitTable:
+
+    def __init__(self):
+        self.exits = dict()
+        self.distances = dict()
+        self.trees = dict()
+        self.dirty = True
+
+    def clear(self, exits: dict) -> None:
+        self.exits = exits
+        self.distances.clear()
+        self.trees.clear()
+        self.dirty = True
+
+    def add_tree(self, exit_id: int, best: dict, previous: dict) -> None:
+        self.trees[exit_id] = previous
+        for other_id, other in self.exits.items():
+            if other in best:
+                self.distances[exit_id, other_id] = best[other]
+
+    def distance(self, exit_s: int, exit_t: int) -> float | None:
+        return self.distances.get((exit_s, exit_t))
+
+    def path(self, exit_s: int, exit_t: int) -> list[int]:
+        previous = self.trees[exit_s]
+        result = list()
+        current = self.exits[exit_t]
+        while current != -1:
+            result.append(current)
+            current = previous[current]
+        return result[::-1]
@@ -0,0 +1,337 @@
+import math
+from array import array
+
+from app.map_module.dataclasses import KEY_TYPES
+
+
+KIND_ROOM = 0
+KIND_STREET = 1
+KIND_ELEVATOR = 2
+KIND_DOOR = 3
+KIND_KORPUS = 4
+KIND_DELETED = 255
+
+KINDS = {
+    KEY_TYPES.STREET: KIND_STREET,
+    KEY_TYPES.ELEVATOR: KIND_ELEVATOR,
+    KEY_TYPES.DOOR: KIND_DOOR,
+    KEY_TYPES.KORPUS: KIND_KORPUS,
+}
+
+
+GRAPH_ARRAYS = (
+    "ids",
+    "x",
+    "y",
+    "z",
+    "kind",
+    "edge_ids",
+    "edge_u",
+    "edge_v",
+    "distance",
+    "time",
+    "t_weight",
+    "offsets",
+    "adj",
+    "adj_edge",
+    "adj_distance",
+    "adj_time",
+    "adj_t_weight",
+    "edge_pos",
+)
+
+
+def kind_of(type_name: str) -> int:
+    return KINDS.get(type_name, KIND_ROOM)
+
+
+def kind_mask(*kinds: int) -> bytes:
+    mask = bytearray(256)
+    for kind in kinds:
+        mask[kind] = 1
+    return bytes(mask)
+
+
+class Graph:
+    """CSR adjacency over dense node indexes.
+
+    Removing an edge or changing its weights patches the CSR in place, adding an
+    edge marks it dirty until the next ``build()``. After ``attach()`` the
+    arrays are read-only views into a snapshot and must not be mutated;
+    ``adopt()`` copies them into arrays of its own instead.
+    """
+
+    def __init__(self):
+        self.index = dict()
+        self.ids = array("q")
+        self.x = array("d")
+        self.y = array("d")
+        self.z = array("d")
+        self.kind = bytearray()
+        self.free_nodes = list()
+
+        self.edge_index = dict()
+        self.edge_ids = array("q")
+        self.edge_u = array("l")
+        self.edge_v = array("l")
+        self.distance = array("d")
+        self.time = array("d")
+        self.t_weight = array("d")
+        self.free_edges = list()
+
+        self.offsets = array("l", [0])
+        self.adj = array("l")
+        self.adj_edge = array("l")
+        self.adj_distance = array("d")
+        self.adj_time = array("d")
+        self.adj_t_weight = array("d")
+        self.edge_pos = array("l")
+        self.dirty = False
+        self.revision = 0
+        self.derived = dict()
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.index
+
+    def add_node(self, node_id: int, x: float, y: float, z: float, kind: int) -> int:
+        x, y, z = float(x), float(y), float(z)
+        if self.free_nodes:
+            idx = self.free_nodes.pop()
+            self.ids[idx] = node_id
+            self.x[idx] = x
+            self.y[idx] = y
+            self.z[idx] = z
+            self.kind[idx] = kind
+        else:
+            idx = len(self.ids)
+            self.ids.append(node_id)
+            self.x.append(x)
+            self.y.append(y)
+            self.z.append(z)
+            self.kind.append(kind)
+            if not self.dirty:
+                self.offsets.append(self.offsets[-1])
+        self.index[node_id] = idx
+        return idx
+
+    def move_node(self, node_id: int, x: float, y: float, z: float) -> None:
+        idx = self.index[node_id]
+        self.x[idx] = x
+        self.y[idx] = y
+        self.z[idx] = z
+        self.revision += 1
+
+    def set_kind(self, node_id: int, kind: int) -> None:
+        self.kind[self.index[node_id]] = kind
+
+    def remove_node(self, node_id: int) -> None:
+        idx = self.index[node_id]
+        for slot in list(self.incident(idx)):
+            self.remove_edge(self.edge_ids[slot])
+        del self.index[node_id]
+        self.ids[idx] = -1
+        self.kind[idx] = KIND_DELETED
+        self.free_nodes.append(idx)
+
+    def add_edge(
+        self,
+        conn_id: int,
+        node1_id: int,
+        node2_id: int,
+        distance: float,
+        time: float,
+        t_weight: float,
+    ) -> int:
+        u = self.index[node1_id]
+        v = self.index[node2_id]
+        distance, time, t_weight = float(distance), float(time), float(t_weight)
+        if self.free_edges:
+            slot = self.free_edges.pop()
+            self.edge_ids[slot] = conn_id
+            self.edge_u[slot] = u
+            self.edge_v[slot] = v
+            self.distance[slot] = distance
+            self.time[slot] = time
+            self.t_weight[slot] = t_weight
+        else:
+            slot = len(self.edge_ids)
+            self.edge_ids.append(conn_id)
+            self.edge_u.append(u)
+            self.edge_v.append(v)
+            self.distance.append(distance)
+            self.time.append(time)
+            self.t_weight.append(t_weight)
+        self.edge_index[conn_id] = slot
+        self.dirty = True
+        self.revision += 1
+        return slot
+
+    def set_weights(
+        self, conn_id: int, distance: float, time: float, t_weight: float
+    ) -> None:
+        slot = self.edge_index[conn_id]
+        self.distance[slot] = distance
+        self.time[slot] = time
+        self.t_weight[slot] = t_weight
+        self.revision += 1
+        if not self.dirty:
+            for pos in (self.edge_pos[2 * slot], self.edge_pos[2 * slot + 1]):
+                self.adj_distance[pos] = distance
+                self.adj_time[pos] = time
+                self.adj_t_weight[pos] = t_weight
+
+    def remove_edge(self, conn_id: int) -> None:
+        slot = self.edge_index.pop(conn_id)
+        self.edge_ids[slot] = -1
+        self.revision += 1
+        if not self.dirty:
+            self.adj[self.edge_pos[2 * slot]] = -1
+            self.adj[self.edge_pos[2 * slot + 1]] = -1
+        self.free_edges.append(slot)
+
+    def edge_nodes(self, conn_id: int) -> tuple[int, int]:
+        slot = self.edge_index[conn_id]
+        return self.ids[self.edge_u[slot]], self.ids[self.edge_v[slot]]
+
+    def incident(self, idx: int):
+        self.build()
+        adj = self.adj
+        adj_edge = self.adj_edge
+        for pos in range(self.offsets[idx], self.offsets[idx + 1]):
+            if adj[pos] >= 0:
+                yield adj_edge[pos]
+
+    def neighbors(self, idx: int):
+        self.build()
+        adj = self.adj
+        for pos in range(self.offsets[idx], self.offsets[idx + 1]):
+            if adj[pos] >= 0:
+                yield adj[pos], pos
+
+    def build(self) -> None:
+        if not self.dirty:
+            return None
+        size = len(self.ids)
+        edge_ids = self.edge_ids
+        edge_u = self.edge_u
+        edge_v = self.edge_v
+        offsets = array("l", [0]) * (size + 1)
+        for slot in range(len(edge_ids)):
+            if edge_ids[slot] < 0:
+                continue
+            offsets[edge_u[slot] + 1] += 1
+            offsets[edge_v[slot] + 1] += 1
+        for idx in range(size):
+            offsets[idx + 1] += offsets[idx]
+        total = offsets[size]
+        adj = array("l", [-1]) * total
+        adj_edge = array("l", [-1]) * total
+        adj_distance = array("d", [0.0]) * total
+        adj_time = array("d", [0.0]) * total
+        adj_t_weight = array("d", [0.0]) * total
+        edge_pos = array("l", [-1]) * (2 * len(edge_ids))
+        cursor = array("l", offsets[:size])
+        for slot in range(len(edge_ids)):
+            if edge_ids[slot] < 0:
+                continue
+            for end, (u, v) in enumerate(
+                ((edge_u[slot], edge_v[slot]), (edge_v[slot], edge_u[slot]))
+            ):
+                pos = cursor[u]
+                cursor[u] += 1
+                adj[pos] = v
+                adj_edge[pos] = slot
+                adj_distance[pos] = self.distance[slot]
+                adj_time[pos] = self.time[slot]
+                adj_t_weight[pos] = self.t_weight[slot]
+                edge_pos[2 * slot + end] = pos
+        self.offsets = offsets
+        self.adj = adj
+        self.adj_edge = adj_edge
+        self.adj_distance = adj_distance
+        self.adj_time = adj_time
+        self.adj_t_weight = adj_t_weight
+        self.edge_pos = edge_pos
+        self.dirty = False
+        return None
+
+    def adopt(self, snapshot) -> None:
+        for name in GRAPH_ARRAYS:
+            section = snapshot[f"graph.{name}"]
+            if isinstance(getattr(self, name), bytearray):
+                setattr(self, name, bytearray(section))
+            else:
+                values = array(section.format)
+                values.frombytes(section.cast("B"))
+                setattr(self, name, values)
+        self.index = dict(zip(snapshot["id_sorted"], snapshot["id_slot"]))
+        self.edge_index = {
+            conn_id: slot for slot, conn_id in enumerate(self.edge_ids) if conn_id >= 0
+        }
+        self.free_nodes = [idx for idx, node_id in enumerate(self.ids) if node_id < 0]
+        self.free_edges = [
+            slot for slot, conn_id in enumerate(self.edge_ids) if conn_id < 0
+        ]
+        self.dirty = False
+        self.revision += 1
+        self.derived = dict()
+        return None
+
+    def attach(self, snapshot, index) -> None:
+        for name in GRAPH_ARRAYS:
+            setattr(self, name, snapshot[f"graph.{name}"])
+        self.index = index
+        self.edge_index = dict()
+        self.free_nodes = list()
+        self.free_edges = list()
+        self.dirty = False
+        self.revision += 1
+        self.derived = dict()
+        return None
+
+    def column(self, model) -> array:
+        self.build()
+        if model.key == (1.0, 0.0, 0.0):
+            return self.adj_distance
+        if model.key == (0.0, 1.0, 0.0):
+            return self.adj_time
+        if model.key == (0.0, 0.0, 1.0):
+            return self.adj_t_weight
+        stamp = (self.revision, model.stamp)
+        cached = self.derived.get(("column", model.key))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        if model.profile is None and model.lift == 1.0:
+            column = array(
+                "d",
+                map(model.cost, self.adj_distance, self.adj_time, self.adj_t_weight),
+            )
+        else:
+            column = array("d", (model.slot_cost(self, slot) for slot in self.adj_edge))
+        self.derived["column", model.key] = (stamp, column)
+        return column
+
+    def heuristic_scale(self, model) -> float:
+        stamp = (self.revision, model.stamp)
+        cached = self.derived.get(("scale", model.key))
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        scale = math.inf
+        for slot in range(len(self.edge_ids)):
+            if self.edge_ids[slot] < 0:
+                continue
+            u = self.edge_u[slot]
+            v = self.edge_v[slot]
+            length = math.sqrt(
+                (self.x[u] - self.x[v]) ** 2
+                + (self.y[u] - self.y[v]) ** 2
+                + (self.z[u] - self.z[v]) ** 2
+            )
+            if length > 0:
+                scale = min(scale, model.slot_cost(self, slot) / length)
+        scale = 0.0 if scale == math.inf else max(scale, 0.0)
+        self.derived["scale", model.key] = (stamp, scale)
+        return scale
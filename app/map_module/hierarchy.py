@@ -0,0 +1,179 @@
+import heapq
+import math
+import typing
+from array import array
+
+
+class Hierarchy:
+    """Floor-level portal graph of one cost model.
+
+    Every node below a building belongs to the cell of its floor, the child of
+    the building on its parent chain. Portals are the cell nodes with an edge
+    into another cell and the building exits. Each portal keeps a shortest
+    path tree over its own cell, so a query only searches the start cell, the
+    portal graph and the target cell.
+    """
+
+    def __init__(self):
+        self.cell = array("q")
+        self.members = dict()
+        self.portals = dict()
+        self.links = dict()
+        self.trees = dict()
+        self.structure_dirty = True
+        self.dirty = set()
+
+    def cell_of(self, idx: int) -> int:
+        return self.cell[idx] if idx < len(self.cell) else -1
+
+    def build_cells(
+        self, graph, cell_of: typing.Callable[[int], int], exits: set, blocked: bytes
+    ) -> None:
+        self.cell = array("q", (cell_of(idx) for idx in range(len(graph.ids))))
+        self.members = dict()
+        self.portals = dict()
+        cell = self.cell
+        adj = graph.adj
+        offsets = graph.offsets
+        for idx in range(len(cell)):
+            if cell[idx] < 0:
+                continue
+            self.members.setdefault(cell[idx], list()).append(idx)
+            if blocked[graph.kind[idx]]:
+                continue
+            crossing = idx in exits
+            for pos in range(offsets[idx], offsets[idx + 1]):
+                neighbor = adj[pos]
+                if neighbor >= 0 and cell[neighbor] >= 0 and cell[neighbor] != cell[idx]:
+                    crossing = True
+                    break
+            if crossing:
+                self.portals.setdefault(cell[idx], list()).append(idx)
+        self.links = dict()
+        self.trees = dict()
+        self.dirty = set(self.members)
+        self.structure_dirty = False
+        return None
+
+    def refresh(self, graph, cost, blocked: bytes) -> None:
+        cell = self.cell
+        adj = graph.adj
+        offsets = graph.offsets
+        kind = graph.kind
+        for cell_id in self.dirty:
+            for portal in self.portals.get(cell_id, ()):
+                best, previous = self.local(graph, cost, blocked, portal, set())
+                self.trees[portal] = previous
+                links = [
+                    (other, best[other], -1)
+                    for other in self.portals[cell_id]
+                    if other != portal and other in best
+                ]
+                for pos in range(offsets[portal], offsets[portal + 1]):
+                    neighbor = adj[pos]
+                    if neighbor < 0 or cell[neighbor] < 0 or cell[neighbor] == cell_id:
+                        continue
+                    if blocked[kind[neighbor]]:
+                        continue
+                    links.append((neighbor, cost[pos], pos))
+                self.links[portal] = links
+        self.dirty = set()
+        return None
+
+    def local(self, graph, cost, blocked: bytes, source: int, goals: set):
+        cell = self.cell
+        home = cell[source]
+        offsets = graph.offsets
+        adj = graph.adj
+        kind = graph.kind
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        best = {source: 0.0}
+        previous = {source: -1}
+        to_visit = [(0.0, source)]
+        while to_visit:
+            start_distance, current = heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            if current != source and current in goals and blocked[kind[current]]:
+                continue
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0 or cell[neighbor] != home:
+                    continue
+                if blocked[kind[neighbor]] and neighbor not in goals:
+                    continue
+                distance = start_distance + cost[pos]
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = current
+                    heappush(to_visit, (distance, neighbor))
+        return best, previous
+
+    def search(self, graph, cost, blocked: bytes, source: int, goals: set):
+        best_s, previous_s = self.local(graph, cost, blocked, source, goals)
+        reached = dict()
+        to_visit = list()
+        for portal in self.portals.get(self.cell[source], ()):
+            if portal in best_s:
+                reached[portal] = (best_s[portal], -1, -1)
+                to_visit.append((best_s[portal], portal))
+        heapq.heapify(to_visit)
+        while to_visit:
+            distance, portal = heapq.heappop(to_visit)
+            if distance > reached[portal][0]:
+                continue
+            for other, step, pos in self.links.get(portal, ()):
+                if distance + step < reached.get(other, (math.inf,))[0]:
+                    reached[other] = (distance + step, portal, pos)
+                    heapq.heappush(to_visit, (distance + step, other))
+
+        best = dict()
+        tails = dict()
+        for goal in goals:
+            length = best_s.get(goal, math.inf)
+            via = None
+            if goal in reached and reached[goal][0] < length:
+                length = reached[goal][0]
+                via = (goal, None)
+            elif goal not in self.trees:
+                tail, tail_previous = self.local(graph, cost, blocked, goal, set())
+                for portal in self.portals.get(self.cell_of(goal), ()):
+                    if portal in reached and portal in tail:
+                        if reached[portal][0] + tail[portal] < length:
+                            length = reached[portal][0] + tail[portal]
+                            via = (portal, tail_previous)
+            if length < math.inf:
+                best[goal] = length
+                tails[goal] = via
+
+        def walk(goal: int) -> list[int]:
+            via = tails[goal]
+            if via is None:
+                return self.__walk(previous_s, goal)
+            portal, tail_previous = via
+            result = (
+                [goal]
+                if tail_previous is None
+                else self.__walk(tail_previous, portal)[::-1]
+            )
+            while True:
+                _, parent, pos = reached[portal]
+                if parent < 0:
+                    return result[:-1] + self.__walk(previous_s, portal)
+                if pos < 0:
+                    result.extend(self.__walk(self.trees[parent], portal)[1:])
+                else:
+                    result.append(parent)
+                portal = parent
+
+        return best, walk
+
+    @staticmethod
+    def __walk(previous: dict, current: int) -> list[int]:
+        result = list()
+        while current != -1:
+            result.append(current)
+            current = previous[current]
+        return result
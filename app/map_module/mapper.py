@@ -1,452 +1,1669 @@
 import typing
-import gc
+import asyncio
+import contextlib
+import functools
 import math
 import heapq
-from app.map_module.node import NodeType, Node, Connection, RouteNode
-from app.map_module.dataclasses import KEY_TYPES
-from app.map.dataclasses import NodetypeDC, NodeDC, NodeConnectionDC
+import os
+import threading
+import time
+from array import array
+from logging import getLogger
+from app.map_module.node import NodeType, Node
+from app.map_module.ancestors import AncestorTable
+from app.map_module.dataclasses import KEY_TYPES, Lift_Weight
+from app.map_module.cache import RouteCache
+from app.map_module.changes import ChangeSet
+from app.map_module.cost import CostModel, SHORTEST
+from app.map_module.executor import RouteExecutor
+from app.map_module.exits import ExitTable
+from app.map_module.contraction import ContractionIndex
+from app.map_module.hierarchy import Hierarchy
+from app.map_module.metrics import ExpansionCounter, LatencyMeter
+from app.map_module.profiles import Profile, default_profiles
+from app.map_module.shared import SharedNodes
+from app.map_module.snapshot import read_snapshot, write_snapshot
+from app.map_module.spatial import SpatialIndex
+from app.map_module.vertical import TransferTable
+from app.map_module.graph import (
+    Graph,
+    kind_of,
+    kind_mask,
+    KIND_STREET,
+    KIND_ELEVATOR,
+    KIND_DOOR,
+    KIND_KORPUS,
+)
+from app.map.dataclasses import NodetypeDC, NodeDC, NodeConnectionDC, ChangeDC
 
 
 if typing.TYPE_CHECKING:
     from app.web.app import Application
 
 
+BUILDING_BLOCKED = kind_mask(KIND_STREET, KIND_ELEVATOR)
+STREET_BLOCKED = bytes(1 - flag for flag in kind_mask(KIND_STREET, KIND_DOOR))
+NEAREST_BLOCKED = kind_mask(KIND_ELEVATOR)
+NEAREST_LIFT_BLOCKED = kind_mask()
+LIFT_BLOCKED = kind_mask(KIND_STREET)
+LIFTS = kind_mask(KIND_ELEVATOR)
+LOAD_YIELD_EVERY = 5000
+
+P = typing.ParamSpec("P")
+T = typing.TypeVar("T")
+
+
 class Map:
 
     def __init__(self, app: "Application"):
         self.app = app
         self.types = dict()
         self.nodes = dict()
-        self.all_cones = dict()
+        self.graph = Graph()
         self.exits = dict()
         self.exits_list = set()
+        self.exit_tables = dict()
+        self.hierarchies = dict()
+        self.contractions = dict()
+        self.transfers = dict()
+        self.ancestors = AncestorTable()
+        self.spatial = None
+        self.profiles = default_profiles()
+        for name, spec in self.app.config.map.route_profiles.items():
+            self.profiles[name] = Profile(name, **spec)
+        self.route_cache = RouteCache(
+            self.app.config.map.route_cache_size, self.app.config.map.route_cache_ttl
+        )
+        self.version = 0
+        self.navigate_latency = LatencyMeter()
+        self.expansions = ExpansionCounter()
+        self.executor = RouteExecutor(self.app.config.map)
+        self.lock = threading.RLock()
+        self.changes = None
+        self.start_lock = asyncio.Lock()
+        self.start_task = None
+        self.ready = asyncio.Event()
+        self.state = "idle"
         self.working = False
+        self.load_stats = dict()
+        self.marker = 0
+        self.gaps = dict()
+        self.shared = None
+        self.shared_inode = None
+        self.shared_checked = 0.0
+        self.logger = getLogger("map")
 
     async def start(self):
-        nodetypes = await self.app.store.mapAPI.get_all_types(page=None, limit=None)
-        for nodetype in nodetypes.types:
-            if nodetype.parent_id:
-                self.types[f"{nodetype.id}"] = NodeType(
-                    id=nodetype.id,
-                    name=nodetype.name,
-                    parent=self.types[f"{nodetype.parent_id}"],
-                )
-                self.types[f"{nodetype.parent_id}"].childrens.append(nodetype.id)
-            else:
-                self.types[f"{nodetype.id}"] = NodeType(nodetype.id, nodetype.name)
-        del nodetypes
-        gc.collect()
-        nodes = await self.app.store.mapAPI.get_all_nodes(page=None, limit=None)
-        if nodes:
-            for node in nodes.nodes:
-                if node.parent_id:
-                    self.nodes[f"{node.id}"] = Node(
-                        id=node.id,
-                        typeNode=self.types[f"{node.type_id}"],
-                        x=node.x_cord,
-                        y=node.y_cord,
-                        z=node.z_cord,
-                        parent=self.nodes[f"{node.parent_id}"],
-                        depth=self.nodes[f"{node.parent_id}"].depth + 1,
-                        name=node.name,
-                    )
-                    self.nodes[f"{node.parent_id}"].childrens.append(node.id)
-                else:
-                    self.nodes[f"{node.id}"] = Node(
-                        id=node.id,
-                        typeNode=self.types[f"{node.type_id}"],
-                        x=node.x_cord,
-                        y=node.y_cord,
-                        z=node.z_cord,
-                        depth=1,
-                        name=node.name,
-                    )
-        del nodes
-        gc.collect()
-        for node_id, node in self.nodes.items():
-            conns = await self.app.store.mapAPI.get_all_connections_of_node(int(node_id))
-            if conns:
-                for conn in conns.conns:
-                    self.all_cones[f"{conn.id}"] = Connection(
-                        id=conn.id,
-                        distance=conn.distance,
-                        t_weight=conn.t_weight,
-                        time=conn.time,
-                    )
-                    if conn.node1_id == int(node_id):
-                        node.conns[f"{conn.node2_id}"] = self.all_cones[f"{conn.id}"]
-                    else:
-                        node.conns[f"{conn.node1_id}"] = self.all_cones[f"{conn.id}"]
-                    if (
-                        self.nodes[f"{conn.node1_id}"].type.name == KEY_TYPES.STREET
-                        and self.nodes[f"{conn.node2_id}"].type.name != KEY_TYPES.STREET
-                    ):
-                        kor = await self.__go_up(KEY_TYPES.KORPUS, self.nodes[f"{conn.node2_id}"])
-                        if f"{kor.id}" in self.exits:
-                            exits = self.exits[f"{kor.id}"]
-                            if f"{conn.node2_id}" not in exits:
-                                exits[f"{conn.node2_id}"] = self.nodes[f"{conn.node2_id}"]
-                                self.exits[f"{kor.id}"] = exits
-                        else:
-                            exits = dict()
-                            exits[f"{conn.node2_id}"] = self.nodes[f"{conn.node2_id}"]
-                            self.exits[f"{kor.id}"] = exits
-                        self.exits_list.add(conn.node2_id)
-                    elif (
-                        self.nodes[f"{conn.node2_id}"].type.name == KEY_TYPES.STREET
-                        and self.nodes[f"{conn.node1_id}"].type.name != KEY_TYPES.STREET
-                    ):
-                        kor = await self.__go_up(KEY_TYPES.KORPUS, self.nodes[f"{conn.node1_id}"])
-                        if f"{kor.id}" in self.exits:
-                            exits = self.exits[f"{kor.id}"]
-                            if f"{conn.node1_id}" not in exits:
-                                exits[f"{conn.node1_id}"] = self.nodes[f"{conn.node1_id}"]
-                                self.exits[f"{kor.id}"] = exits
-                        else:
-                            exits = dict()
-                            exits[f"{conn.node1_id}"] = self.nodes[f"{conn.node1_id}"]
-                            self.exits[f"{kor.id}"] = exits
-                        self.exits_list.add(conn.node1_id)
-        del conns
-        gc.collect()
+        path = self.app.config.map.snapshot_path
+        if self.app.config.map.graph_mode == "shared":
+            self.working = await self.attach()
+            return None
+        source = self.app.store.mapAPI
+        marker = await source.get_change_marker()
+        gaps = await source.get_missing_changes(
+            marker, self.app.config.map.change_gap_window
+        )
+        if not path:
+            await self.load(source)
+            self.follow_changes(marker, gaps)
+            self.working = True
+            return None
+        snapshot = read_snapshot(path)
+        if snapshot is not None and (
+            snapshot.marker != marker
+            or await source.get_changes(marker, 1, list(snapshot["gap_id"]))
+        ):
+            self.logger.info(
+                "snapshot %s is stale: marker %d, database %d",
+                path,
+                snapshot.marker,
+                marker,
+            )
+            snapshot.close()
+            snapshot = None
+        if snapshot is not None:
+            try:
+                self.adopt(snapshot)
+                self.follow_changes(snapshot.marker, snapshot["gap_id"])
+            finally:
+                snapshot.close()
+        else:
+            await self.load(source)
+            self.follow_changes(marker, gaps)
+            size = write_snapshot(path, self, marker)
+            self.logger.info("snapshot %s written: %d bytes", path, size)
         self.working = True
+        return None
 
-    async def __go_up(self, target_class: str, node: Node) -> Node | None:
-        current_node = node
-        while current_node.type.name != target_class:
-            current_node = current_node.parent
-        if current_node.type.name == target_class:
-            return current_node
+    async def load(self, source) -> None:
+        started = time.perf_counter()
+        stats = {
+            "source": "database",
+            "types": 0,
+            "nodes": 0,
+            "connections": 0,
+            "exits": 0,
+            "seconds": 0.0,
+        }
+        self.load_stats = stats
+        async for nodetype in source.stream_types():
+            self.add_type(nodetype)
+            stats["types"] += 1
+        async for node in source.stream_nodes():
+            self.add_node(node)
+            stats["nodes"] += 1
+            if stats["nodes"] % LOAD_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        async for conn in source.stream_connections():
+            self.graph.add_edge(
+                conn.id,
+                conn.node1_id,
+                conn.node2_id,
+                conn.distance,
+                conn.time,
+                conn.t_weight,
+            )
+            self.__register_exit(self.nodes[conn.node1_id], self.nodes[conn.node2_id])
+            stats["connections"] += 1
+            if stats["connections"] % LOAD_YIELD_EVERY == 0:
+                await asyncio.sleep(0)
+        self.__loaded(stats, started)
         return None
 
-    async def add_type(self, nodetype: NodetypeDC) -> None:
-        if nodetype.parent_id:
-            self.types[f"{nodetype.id}"] = NodeType(
-                id=nodetype.id,
-                name=nodetype.name,
-                parent=self.types[f"{nodetype.parent_id}"],
+    def adopt(self, snapshot) -> None:
+        started = time.perf_counter()
+        stats = {
+            "source": "snapshot",
+            "types": 0,
+            "nodes": 0,
+            "connections": len(snapshot["conn_id"]),
+            "exits": 0,
+            "seconds": 0.0,
+        }
+        self.load_stats = stats
+        for nodetype in snapshot.type_rows():
+            self.add_type(nodetype)
+            stats["types"] += 1
+        nodes = dict()
+        parents = list()
+        for row in snapshot.node_rows():
+            nodetype = self.types[row.type_id]
+            nodes[row.id] = Node(
+                id=row.id,
+                typeNode=nodetype,
+                x=row.x_cord,
+                y=row.y_cord,
+                z=row.z_cord,
+                depth=0 if row.parent_id else 1,
+                name=row.name,
             )
-        else:
-            self.types[f"{nodetype.id}"] = NodeType(nodetype.id, nodetype.name)
+            nodetype.proto.append(row.id)
+            if row.parent_id:
+                parents.append((row.id, row.parent_id))
+        for node_id, parent_id in parents:
+            nodes[node_id].parent = nodes[parent_id]
+            nodes[parent_id].childrens.append(node_id)
+        for node in nodes.values():
+            chain = list()
+            while node.depth == 0:
+                chain.append(node)
+                node = node.parent
+            for child in reversed(chain):
+                child.depth = child.parent.depth + 1
+        self.nodes = nodes
+        stats["nodes"] = len(nodes)
+        self.graph.adopt(snapshot)
+        building, floor = array("q"), array("q")
+        building.frombytes(snapshot["anc_bld"].cast("B"))
+        floor.frombytes(snapshot["anc_flr"].cast("B"))
+        self.ancestors.attach(building, floor)
+        for kor_id, exit_id in zip(snapshot["exit_kor"], snapshot["exit_id"]):
+            self.exits.setdefault(kor_id, dict())[exit_id] = nodes[exit_id]
+            self.exits_list.add(exit_id)
+        self.version += 1
+        self.__loaded(stats, started)
         return None
 
-    async def add_node(self, node: NodeDC) -> None:
-        if node.parent_id:
-            self.nodes[f"{node.id}"] = Node(
-                id=node.id,
-                typeNode=self.types[f"{node.type_id}"],
-                x=node.x_cord,
-                y=node.y_cord,
-                z=node.z_cord,
-                parent=self.nodes[f"{node.parent_id}"],
-                depth=self.nodes[f"{node.parent_id}"].depth + 1,
-                name=node.name,
+    def __loaded(self, stats: dict, started: float) -> None:
+        self.graph.build()
+        self.__refresh_exits(SHORTEST)
+        if self.app.config.map.route_planner == "hierarchical":
+            self.__refresh_hierarchy(SHORTEST)
+        if self.app.config.map.route_engine == "contraction":
+            self.__contraction(BUILDING_BLOCKED, SHORTEST)
+            self.__contraction(STREET_BLOCKED, SHORTEST)
+        stats["exits"] = len(self.exits_list)
+        stats["seconds"] = round(time.perf_counter() - started, 3)
+        self.logger.info(
+            "graph loaded from %s in %.3fs: %d types, %d nodes, %d connections, %d exits",
+            stats["source"],
+            stats["seconds"],
+            stats["types"],
+            stats["nodes"],
+            stats["connections"],
+            stats["exits"],
+        )
+        return None
+
+    async def attach(self) -> bool:
+        started = time.perf_counter()
+        path = self.app.config.map.snapshot_path
+        snapshot = read_snapshot(path) if path else None
+        if snapshot is None:
+            self.logger.error("no map snapshot to attach at %s", path)
+            return False
+        types = dict()
+        async for nodetype in snapshot.stream_types():
+            types[nodetype.id] = NodeType(
+                nodetype.id, nodetype.name, parent=types.get(nodetype.parent_id)
             )
+            if nodetype.parent_id:
+                types[nodetype.parent_id].childrens.append(nodetype.id)
+        for node_id, type_id in zip(snapshot["node_id"], snapshot["node_typ"]):
+            types[type_id].proto.append(node_id)
+        nodes = SharedNodes(snapshot, types)
+        exits = dict()
+        for kor_id, exit_id in zip(snapshot["exit_kor"], snapshot["exit_id"]):
+            exits.setdefault(kor_id, dict())[exit_id] = nodes[exit_id]
+        graph = Graph()
+        graph.attach(snapshot, nodes.index)
+        await self.__offload(self.__swap, snapshot, types, nodes, graph, exits)
+        self.load_stats = {
+            "source": "shared",
+            "marker": snapshot.marker,
+            "types": len(types),
+            "nodes": len(nodes),
+            "connections": len(snapshot["conn_id"]),
+            "exits": len(self.exits_list),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+        self.logger.info(
+            "attached %s at change marker %d in %.3fs",
+            path,
+            snapshot.marker,
+            self.load_stats["seconds"],
+        )
+        return True
+
+    def __swap(
+        self, snapshot, types: dict, nodes: SharedNodes, graph: Graph, exits: dict
+    ):
+        self.types = types
+        self.nodes = nodes
+        self.graph = graph
+        self.exits = exits
+        self.exits_list = {
+            exit_id for kor_exits in exits.values() for exit_id in kor_exits
+        }
+        self.exit_tables = dict()
+        self.hierarchies = dict()
+        self.contractions = dict()
+        self.transfers = dict()
+        for profile in self.profiles.values():
+            profile.dirty = True
+        self.ancestors = AncestorTable()
+        self.ancestors.attach(snapshot["anc_bld"], snapshot["anc_flr"])
+        self.spatial = None
+        self.route_cache.clear()
+        self.version += 1
+        self.shared = snapshot
+        self.shared_inode = snapshot.inode()
+        self.follow_changes(snapshot.marker, snapshot["gap_id"])
+        return None
+
+    async def __follow_shared(self) -> None:
+        if self.shared is None:
+            return None
+        now = time.monotonic()
+        if now - self.shared_checked < self.app.config.map.shared_graph_poll:
+            return None
+        self.shared_checked = now
+        try:
+            inode = os.stat(self.app.config.map.snapshot_path).st_ino
+        except FileNotFoundError:
+            return None
+        if inode != self.shared_inode:
+            await self.attach()
+        return None
+
+    def __stale(self) -> None:
+        self.shared_checked = 0.0
+        self.route_cache.clear()
+        return None
+
+    async def ensure_started(self) -> None:
+        async with self.start_lock:
+            if self.working:
+                return None
+            self.state = "loading"
+            try:
+                await self.start()
+            except BaseException:
+                self.state = "failed"
+                self.__reset()
+                raise
+            if self.working:
+                self.state = "ready"
+                self.ready.set()
+            else:
+                self.state = "failed"
+        return None
+
+    async def autostart(self, *_: list, **__: dict) -> None:
+        if self.app.config.map.autostart:
+            self.start_task = asyncio.create_task(self.__autostart())
+        return None
+
+    async def __autostart(self) -> None:
+        try:
+            await self.ensure_started()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error("graph load on startup failed", exc_info=e)
+        return None
+
+    async def stop(self, *_: list, **__: dict) -> None:
+        if self.start_task is not None and not self.start_task.done():
+            self.start_task.cancel()
+        return None
+
+    async def wait_ready(self, timeout: float) -> bool:
+        if self.working:
+            return True
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self.working
+
+    def progress(self) -> dict:
+        return {"state": self.state, "working": self.working, **self.load_stats}
+
+    def __reset(self) -> None:
+        self.types = dict()
+        self.nodes = dict()
+        self.graph = Graph()
+        self.exits = dict()
+        self.exits_list = set()
+        self.exit_tables = dict()
+        self.hierarchies = dict()
+        self.contractions = dict()
+        self.transfers = dict()
+        for profile in self.profiles.values():
+            profile.dirty = True
+        self.ancestors = AncestorTable()
+        self.spatial = None
+        self.route_cache.clear()
+        return None
+
+    def __register_exit(self, node1: Node, node2: Node) -> None:
+        if node1.type.name == KEY_TYPES.STREET and node2.type.name != KEY_TYPES.STREET:
+            exit_node = node2
+        elif node2.type.name == KEY_TYPES.STREET and node1.type.name != KEY_TYPES.STREET:
+            exit_node = node1
         else:
-            self.nodes[f"{node.id}"] = Node(
+            return None
+        kor_id = self.__building_id(exit_node.id)
+        if kor_id is None:
+            return None
+        self.exits.setdefault(kor_id, dict())[exit_node.id] = exit_node
+        self.exits_list.add(exit_node.id)
+        return None
+
+    def __place(self, node_id: int) -> None:
+        if self.spatial is None:
+            return None
+        idx = self.graph.index[node_id]
+        self.spatial.add(
+            node_id,
+            self.__floor_of(idx),
+            self.graph.x[idx],
+            self.graph.y[idx],
+            self.graph.z[idx],
+        )
+        return None
+
+    def __building_id(self, node_id: int) -> int | None:
+        kor_id = self.ancestors.building_of(self.graph.index[node_id])
+        return None if kor_id < 0 else kor_id
+
+    def __korpus(self, node_id: int) -> Node | None:
+        kor_id = self.__building_id(node_id)
+        return None if kor_id is None else self.nodes[kor_id]
+
+    def __parent_id(self, node_id: int) -> int:
+        parent = self.nodes[node_id].parent
+        return -1 if parent is None else parent.id
+
+    def add_type(self, nodetype: NodetypeDC) -> None:
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            if nodetype.id in self.types:
+                return self.change_type(nodetype)
+            if nodetype.parent_id:
+                self.types[nodetype.id] = NodeType(
+                    id=nodetype.id,
+                    name=nodetype.name,
+                    parent=self.types[nodetype.parent_id],
+                )
+                self.types[nodetype.parent_id].childrens.append(nodetype.id)
+            else:
+                self.types[nodetype.id] = NodeType(nodetype.id, nodetype.name)
+            self.version += 1
+            return None
+
+    def add_node(self, node: NodeDC) -> None:
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            if node.id in self.nodes:
+                return self.change_node(node)
+            nodetype = self.types[node.type_id]
+            parent = self.nodes[node.parent_id] if node.parent_id else None
+            idx = self.graph.add_node(
+                node.id,
+                node.x_cord,
+                node.y_cord,
+                node.z_cord,
+                kind_of(nodetype.name),
+            )
+            self.nodes[node.id] = Node(
                 id=node.id,
-                typeNode=self.types[f"{node.type_id}"],
+                typeNode=nodetype,
                 x=node.x_cord,
                 y=node.y_cord,
                 z=node.z_cord,
-                depth=1,
+                parent=parent,
+                depth=1 if parent is None else parent.depth + 1,
                 name=node.name,
             )
-        self.types[f"{node.type_id}"].proto.append(node.id)
+            if parent is not None:
+                parent.childrens.append(node.id)
+            nodetype.proto.append(node.id)
+            self.ancestors.add(
+                idx,
+                node.id,
+                self.graph.index[node.parent_id] if node.parent_id else -1,
+                node.parent_id or -1,
+                self.graph.kind[idx] == KIND_KORPUS,
+            )
+            self.__place(node.id)
+            for hierarchy in self.hierarchies.values():
+                hierarchy.structure_dirty = True
+            for transfers in self.transfers.values():
+                transfers.dirty = True
+            for profile in self.profiles.values():
+                profile.dirty = True
+            self.version += 1
+            return None
+
+    def add_conn(self, conn: NodeConnectionDC) -> None:
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            if conn.id in self.graph.edge_index:
+                return self.change_conn(conn)
+            self.graph.add_edge(
+                conn.id,
+                conn.node1_id,
+                conn.node2_id,
+                conn.distance,
+                conn.time,
+                conn.t_weight,
+            )
+            self.__register_exit(self.nodes[conn.node1_id], self.nodes[conn.node2_id])
+            self.__changed(conn.node1_id, conn.node2_id)
+            return None
+
+    def add_graph(self, nodes: list[NodeDC], conns: list[NodeConnectionDC]) -> None:
+        with self.batch():
+            for node in nodes:
+                self.add_node(node)
+            for conn in conns:
+                self.add_conn(conn)
+            return None
+
+    def change_type(self, nodetype: NodetypeDC):
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            previous = self.types[nodetype.id].name
+            if kind_of(previous) != kind_of(nodetype.name):
+                for exit_table in self.exit_tables.values():
+                    exit_table.dirty = True
+                for hierarchy in self.hierarchies.values():
+                    hierarchy.structure_dirty = True
+                for contraction in self.contractions.values():
+                    contraction.structure_dirty = True
+                for transfers in self.transfers.values():
+                    transfers.dirty = True
+                self.route_cache.clear()
+            if previous != nodetype.name and self.profiles:
+                for profile in self.profiles.values():
+                    profile.dirty = True
+                self.route_cache.clear()
+            self.version += 1
+            self.types[nodetype.id].name = nodetype.name
+            for node_id in self.types[nodetype.id].proto:
+                self.graph.set_kind(node_id, kind_of(nodetype.name))
+            if KIND_KORPUS in (kind_of(previous), kind_of(nodetype.name)):
+                self.ancestors.rebuild(self.graph, self.__parent_id, KIND_KORPUS)
+                self.spatial = None
+            return None
+
+    def change_node(self, node: NodeDC):
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            current = self.nodes[node.id]
+            street = self.__touches_street(node.id)
+            if current.type.id != node.type_id:
+                current.type.proto.remove(node.id)
+                self.types[node.type_id].proto.append(node.id)
+                for profile in self.profiles.values():
+                    profile.dirty = True
+            current.type = self.types[node.type_id]
+            current.x = node.x_cord
+            current.y = node.y_cord
+            current.z = node.z_cord
+            current.name = node.name
+            self.graph.move_node(node.id, node.x_cord, node.y_cord, node.z_cord)
+            korpus = self.graph.kind[self.graph.index[node.id]] == KIND_KORPUS
+            self.graph.set_kind(node.id, kind_of(current.type.name))
+            if korpus != (self.graph.kind[self.graph.index[node.id]] == KIND_KORPUS):
+                self.ancestors.rebuild(self.graph, self.__parent_id, KIND_KORPUS)
+                self.spatial = None
+            self.__place(node.id)
+            self.__changed(node.id, street=street)
+            return None
+
+    def change_conn(self, conn: NodeConnectionDC):
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            self.graph.set_weights(conn.id, conn.distance, conn.time, conn.t_weight)
+            self.__changed(conn.node1_id, conn.node2_id, weights_only=True)
+            return None
+
+    def delete_conn(self, id: int, node1_id: int, node2_id: int):
+        if self.shared is not None:
+            return self.__stale()
+        with self.lock:
+            self.__changed(node1_id, node2_id)
+            self.graph.remove_edge(id)
+            return None
+
+    def delete_node(self, node_id: int):
+        if self.shared is not None:
+            return self.__stale()
+        with self.batch():
+            subtree = [node_id]
+            for current in subtree:
+                subtree.extend(self.nodes[current].childrens)
+            node = self.nodes[node_id]
+            if node.parent is not None:
+                node.parent.childrens.remove(node_id)
+            dropped = set(subtree)
+            for nodetype in {self.nodes[current].type for current in subtree}:
+                nodetype.proto = [
+                    other for other in nodetype.proto if other not in dropped
+                ]
+            for current in reversed(subtree):
+                self.__drop_node(current)
+            return None
+
+    def __drop_node(self, node_id: int) -> None:
+        idx = self.graph.index[node_id]
+        for slot in list(self.graph.incident(idx)):
+            conn_id = self.graph.edge_ids[slot]
+            node1_id, node2_id = self.graph.edge_nodes(conn_id)
+            self.delete_conn(conn_id, node1_id, node2_id)
+        self.__changed(node_id)
+        self.exits.pop(node_id, None)
+        for exits in self.exits.values():
+            exits.pop(node_id, None)
+        self.exits_list.discard(node_id)
+        if self.spatial is not None:
+            self.spatial.remove(node_id)
+        self.ancestors.remove(self.graph.index[node_id])
+        self.graph.remove_node(node_id)
+        del self.nodes[node_id]
         return None
 
-    async def add_conn(self, conn: NodeConnectionDC) -> None:
-        self.all_cones[f"{conn.id}"] = Connection(
-            id=conn.id,
-            distance=conn.distance,
-            t_weight=conn.t_weight,
-            time=conn.time,
-        )
-        self.nodes[f"{conn.node1_id}"].conns[f"{conn.node2_id}"] = self.all_cones[
-            f"{conn.id}"
-        ]
-        self.nodes[f"{conn.node2_id}"].conns[f"{conn.node1_id}"] = self.all_cones[
-            f"{conn.id}"
-        ]
-        if (
-            self.nodes[f"{conn.node1_id}"].type.name == KEY_TYPES.STREET
-            and self.nodes[f"{conn.node2_id}"].type.name != KEY_TYPES.STREET
-        ):
-            kor = await self.__go_up(KEY_TYPES.KORPUS, self.nodes[f"{conn.node2_id}"])
-            if f"{kor.id}" in self.exits:
-                exits = self.exits[f"{kor.id}"]
-                if f"{conn.node2_id}" not in exits:
-                    exits[f"{conn.node2_id}"] = self.nodes[f"{conn.node2_id}"]
-                    self.exits[f"{kor.id}"] = exits
+    def delete_type(self, type_id: int):
+        if self.shared is not None:
+            return self.__stale()
+        with self.batch():
+            for child in list(self.types[type_id].childrens):
+                self.delete_type(child)
+            for node in list(self.types[type_id].proto):
+                if node in self.nodes:
+                    self.delete_node(node)
+            nodetype = self.types.pop(type_id)
+            if nodetype.parent is not None:
+                nodetype.parent.childrens.remove(type_id)
+            self.version += 1
+            return None
+
+    async def mutate(
+        self, method: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        return await self.__offload(method, *args, **kwargs)
+
+    async def __offload(
+        self, function: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        if self.executor.mode == "inline":
+            return self.__edit(function, *args, **kwargs)
+        return await asyncio.to_thread(self.__edit, function, *args, **kwargs)
+
+    def __edit(
+        self, function: typing.Callable[P, T], *args: P.args, **kwargs: P.kwargs
+    ) -> T:
+        with self.lock:
+            self.version += 1
+            return function(*args, **kwargs)
+
+    def follow_changes(self, marker: int, gaps: typing.Iterable[int]) -> None:
+        now = time.monotonic()
+        self.marker = marker
+        self.gaps = {change_id: now for change_id in gaps}
+        return None
+
+    def missing_changes(self) -> list[int]:
+        timeout = self.app.config.map.change_gap_timeout
+        now = time.monotonic()
+        for change_id, seen in list(self.gaps.items()):
+            if now - seen > timeout:
+                del self.gaps[change_id]
+                self.logger.info("map change %d never appeared, given up", change_id)
+        return sorted(self.gaps)
+
+    def apply_changes(self, changes: list[ChangeDC], rows: dict) -> int:
+        applied = 0
+        window = self.app.config.map.change_gap_window
+        now = time.monotonic()
+        with self.batch():
+            for change in changes:
+                row = rows[change.entity].get(change.entity_id)
+                try:
+                    if self.__apply(change.entity, change.entity_id, row):
+                        applied += 1
+                except Exception as e:
+                    self.logger.error(
+                        "map change %d (%s %d) skipped",
+                        change.id,
+                        change.entity,
+                        change.entity_id,
+                        exc_info=e,
+                    )
+                if change.id > self.marker:
+                    for missing in range(
+                        max(self.marker + 1, change.id - window), change.id
+                    ):
+                        self.gaps[missing] = now
+                    self.marker = change.id
+                else:
+                    self.gaps.pop(change.id, None)
+        return applied
+
+    def __apply(self, entity: str, entity_id: int, row) -> bool:
+        if entity == "type":
+            current = self.types.get(entity_id)
+            if row is None:
+                if current is None:
+                    return False
+                self.delete_type(entity_id)
+            elif current is None:
+                if row.parent_id and row.parent_id not in self.types:
+                    return False
+                self.add_type(row)
+            elif current.name != row.name:
+                self.change_type(row)
             else:
-                exits = dict()
-                exits[f"{conn.node2_id}"] = self.nodes[f"{conn.node2_id}"]
-                self.exits[f"{kor.id}"] = exits
-            self.exits_list.add(conn.node2_id)
-        elif (
-            self.nodes[f"{conn.node2_id}"].type.name == KEY_TYPES.STREET
-            and self.nodes[f"{conn.node1_id}"].type.name != KEY_TYPES.STREET
-        ):
-            kor = await self.__go_up(KEY_TYPES.KORPUS, self.nodes[f"{conn.node1_id}"])
-            if f"{kor.id}" in self.exits:
-                exits = self.exits[f"{kor.id}"]
-                if f"{conn.node1_id}" not in exits:
-                    exits[f"{conn.node1_id}"] = self.nodes[f"{conn.node1_id}"]
-                    self.exits[f"{kor.id}"] = exits
+                return False
+            return True
+        if entity == "node":
+            current = self.nodes.get(entity_id)
+            if row is None:
+                if current is None:
+                    return False
+                self.delete_node(entity_id)
+            elif current is None:
+                if row.type_id not in self.types:
+                    return False
+                if row.parent_id and row.parent_id not in self.nodes:
+                    return False
+                self.add_node(row)
+            elif (current.name, current.type.id, current.x, current.y, current.z) != (
+                row.name,
+                row.type_id,
+                row.x_cord,
+                row.y_cord,
+                row.z_cord,
+            ):
+                self.change_node(row)
             else:
-                exits = dict()
-                exits[f"{conn.node1_id}"] = self.nodes[f"{conn.node1_id}"]
-                self.exits[f"{kor.id}"] = exits
-            self.exits_list.add(conn.node1_id)
-        return None
+                return False
+            return True
+        if entity == "connection":
+            slot = self.graph.edge_index.get(entity_id)
+            if row is None:
+                if slot is None:
+                    return False
+                self.delete_conn(entity_id, *self.graph.edge_nodes(entity_id))
+            elif slot is None:
+                if row.node1_id not in self.nodes or row.node2_id not in self.nodes:
+                    return False
+                self.add_conn(row)
+            elif (
+                self.graph.distance[slot],
+                self.graph.time[slot],
+                self.graph.t_weight[slot],
+            ) != (row.distance, row.time, row.t_weight):
+                self.change_conn(row)
+            else:
+                return False
+            return True
+        return False
 
-    async def change_type(self, nodetype: NodetypeDC):
-        self.types[f"{nodetype.id}"].name = nodetype.name
-        return None
+    def __calculate_distance(self, current: int, target: int) -> float:
+        x = self.graph.x
+        y = self.graph.y
+        z = self.graph.z
+        return math.sqrt(
+            (x[target] - x[current]) ** 2
+            + (y[target] - y[current]) ** 2
+            + (z[target] - z[current]) ** 2
+        )
 
-    async def change_node(self, node: NodeDC):
-        self.nodes[f"{node.id}"].type = self.types[f"{node.type_id}"]
-        self.nodes[f"{node.id}"].x = node.x_cord
-        self.nodes[f"{node.id}"].y = node.y_cord
-        self.nodes[f"{node.id}"].z = node.z_cord
-        return None
+    def __route_nodes(self, previous: dict, current: int) -> list[Node]:
+        ids = self.graph.ids
+        result = list()
+        while current != -1:
+            result.append(self.nodes[ids[current]])
+            current = previous[current]
+        return result[::-1]
 
-    async def change_conn(self, conn: NodeConnectionDC):
-        self.all_cones[f"{conn.id}"].distance = conn.distance
-        self.all_cones[f"{conn.id}"].time = conn.time
-        self.all_cones[f"{conn.id}"].t_weight = conn.t_weight
-        return None
+    def __astar(
+        self, start_node: int, target_node: int, blocked: bytes, model: CostModel
+    ) -> dict | None:
+        graph = self.graph
+        graph.build()
+        start = graph.index[start_node]
+        target = graph.index[target_node]
+        offsets = graph.offsets
+        adj = graph.adj
+        cost = graph.column(model)
+        scale = graph.heuristic_scale(model)
+        kind = graph.kind
+        x = graph.x
+        y = graph.y
+        z = graph.z
+        tx = x[target]
+        ty = y[target]
+        tz = z[target]
+        sqrt = math.sqrt
+        heappush = heapq.heappush
+        heappop = heapq.heappop
 
-    async def delete_conn(self, id: int, node1_id: int, node2_id: int):
-        del self.nodes[f"{node1_id}"].conns[f"{node2_id}"]
-        del self.nodes[f"{node2_id}"].conns[f"{node1_id}"]
-        del self.all_cones[f"{id}"]
-        gc.collect()
-        return None
+        best = {start: 0.0}
+        previous = {start: -1}
+        remaining = scale * self.__calculate_distance(start, target)
+        to_visit = [(remaining, remaining, 0.0, start)]
+        expanded = 0
 
-    async def delete_node(self, node_id: int):
-        for child in self.nodes[f"{node_id}"].childrens:
-            await self.delete_node(child)
-        for node2_id, value in self.nodes[f"{node_id}"].conns.items():
-            await self.delete_conn(value.id, node_id, node2_id)
-        del self.nodes[f"{node_id}"]
-        gc.collect()
-        return None
+        while to_visit:
+            _, _, start_distance, current = heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            if current == target:
+                return {
+                    "result": self.__route_nodes(previous, current),
+                    "length": start_distance,
+                    "expanded": expanded,
+                }
+            expanded += 1
 
-    async def delete_type(self, type_id: int):
-        for child in self.types[f"{type_id}"].childrens:
-            await self.delete_type(child)
-        for node in self.types[f"{type_id}"].proto:
-            await self.delete_node(node)
-        del self.types[f"{type_id}"]
-        gc.collect()
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0:
+                    continue
+                if blocked[kind[neighbor]] and neighbor != target:
+                    continue
+                distance = start_distance + cost[pos]
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = current
+                    remaining = scale * sqrt(
+                        (tx - x[neighbor]) ** 2
+                        + (ty - y[neighbor]) ** 2
+                        + (tz - z[neighbor]) ** 2
+                    )
+                    heappush(
+                        to_visit, (distance + remaining, remaining, distance, neighbor)
+                    )
         return None
 
-    @staticmethod
-    def __calculate_distance(current: Node, target: Node) -> float:
-        return math.sqrt(
-            (target.x - current.x)**2
-            + (target.y - current.y)**2
-            + (target.z - current.z)**2
+    def __bidirectional(
+        self, start_node: int, target_node: int, blocked: bytes, model: CostModel
+    ) -> dict | None:
+        graph = self.graph
+        graph.build()
+        start = graph.index[start_node]
+        target = graph.index[target_node]
+        offsets = graph.offsets
+        adj = graph.adj
+        cost = graph.column(model)
+        scale = graph.heuristic_scale(model)
+        kind = graph.kind
+        x = graph.x
+        y = graph.y
+        z = graph.z
+        sqrt = math.sqrt
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        def potential(idx: int) -> float:
+            to_target = sqrt(
+                (x[target] - x[idx]) ** 2
+                + (y[target] - y[idx]) ** 2
+                + (z[target] - z[idx]) ** 2
+            )
+            to_start = sqrt(
+                (x[start] - x[idx]) ** 2
+                + (y[start] - y[idx]) ** 2
+                + (z[start] - z[idx]) ** 2
+            )
+            return scale * (to_target - to_start) / 2
+
+        best = ({start: 0.0}, {target: 0.0})
+        previous = ({start: -1}, {target: -1})
+        signs = (1.0, -1.0)
+        to_visit = (
+            [(potential(start), 0.0, start)],
+            [(-potential(target), 0.0, target)],
         )
+        expanded = [0, 0]
+        length = math.inf
+        meeting = -1
+
+        while to_visit[0] and to_visit[1]:
+            if to_visit[0][0][0] + to_visit[1][0][0] >= length:
+                break
+            side = 0 if to_visit[0][0][0] <= to_visit[1][0][0] else 1
+            _, start_distance, current = heappop(to_visit[side])
+            if start_distance > best[side][current]:
+                continue
+            expanded[side] += 1
+            other = best[1 - side]
+            sign = signs[side]
 
-    async def __navigate_building(self, start_node: int, target_node: int):
-        start = self.nodes[f"{start_node}"]
-        target = self.nodes[f"{target_node}"]
-
-        to_visit = []
-        visited = set()
-
-        heapq.heappush(
-            to_visit,
-            RouteNode(
-                target_distance=self.__calculate_distance(start, target),
-                start_distance=0,
-                node=start,
-                previous=-1,
-            ),
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0:
+                    continue
+                if blocked[kind[neighbor]] and neighbor != start and neighbor != target:
+                    continue
+                distance = start_distance + cost[pos]
+                if distance < best[side].get(neighbor, math.inf):
+                    best[side][neighbor] = distance
+                    previous[side][neighbor] = current
+                    heappush(
+                        to_visit[side],
+                        (distance + sign * potential(neighbor), distance, neighbor),
+                    )
+                    if neighbor in other and distance + other[neighbor] < length:
+                        length = distance + other[neighbor]
+                        meeting = neighbor
+
+        self.expansions.add(*expanded)
+        if start == target:
+            length, meeting = 0.0, start
+        if meeting < 0:
+            return None
+        path = (
+            self.__walk(previous[0], meeting)[::-1]
+            + self.__walk(previous[1], meeting)[1:]
         )
+        return {
+            "result": [self.nodes[graph.ids[idx]] for idx in path],
+            "length": length,
+            "expanded": expanded[0] + expanded[1],
+            "forward": expanded[0],
+            "backward": expanded[1],
+        }
 
-        while to_visit:
-            current_node = heapq.heappop(to_visit)
-
-            if current_node.current.id == target.id:
-                result = list()
-                length = current_node.start_distance
-                while current_node.previous != -1:
-                    result.append(current_node.current)
-                    current_node = current_node.previous
-                else:
-                    result.append(current_node.current)
-                return {"result": result[::-1], "length": length}
+    def __navigate_building(
+        self, start_node: int, target_node: int, model: CostModel = SHORTEST
+    ):
+        if self.app.config.map.route_engine == "bidirectional":
+            return self.__bidirectional(start_node, target_node, BUILDING_BLOCKED, model)
+        return self.__astar(start_node, target_node, BUILDING_BLOCKED, model)
 
-            visited.add(current_node.current.id)
+    def __navigate_street(
+        self, start_node: int, target_node: int, model: CostModel = SHORTEST
+    ):
+        if self.app.config.map.route_engine == "bidirectional":
+            return self.__bidirectional(start_node, target_node, STREET_BLOCKED, model)
+        return self.__astar(start_node, target_node, STREET_BLOCKED, model)
 
-            for key_node_id, conn_value in current_node.current.conns.items():
-                if int(key_node_id) in visited:
+    def __navigate_building_elevator(
+        self,
+        start_node: int,
+        target_node: int,
+        model: CostModel = SHORTEST,
+        elevator: str = Lift_Weight.ALLOW,
+    ):
+        graph = self.graph
+        transfers = self.__refresh_transfers(model)
+        start = graph.index[start_node]
+        target = graph.index[target_node]
+        floor = transfers.floor
+        if floor[start] < 0 or floor[target] < 0 or floor[start] == floor[target]:
+            return None
+        found = transfers.search(
+            graph,
+            graph.column(model),
+            BUILDING_BLOCKED if elevator == Lift_Weight.AVOID else LIFT_BLOCKED,
+            start,
+            target,
+        )
+        if found is None:
+            return None
+        length, path = found
+        return {
+            "result": [self.nodes[graph.ids[idx]] for idx in path],
+            "length": length,
+        }
+
+    def __refresh_transfers(self, model: CostModel) -> TransferTable:
+        transfers = self.transfers.setdefault(model.key, TransferTable())
+        if not transfers.dirty:
+            return transfers
+        started = time.perf_counter()
+        self.graph.build()
+        transfers.build(
+            self.graph, self.graph.column(model), self.__floor_of, LIFT_BLOCKED, LIFTS
+        )
+        self.logger.info(
+            "%s floor transfers built in %.3fs: %d shafts, %d elevators",
+            model.name,
+            time.perf_counter() - started,
+            len(transfers.elevator),
+            sum(transfers.elevator),
+        )
+        return transfers
+
+    def __tree(
+        self,
+        source_node: int,
+        targets: typing.Iterable[int],
+        blocked: bytes,
+        model: CostModel,
+    ):
+        graph = self.graph
+        graph.build()
+        source = graph.index[source_node]
+        offsets = graph.offsets
+        adj = graph.adj
+        cost = graph.column(model)
+        kind = graph.kind
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        goals = {graph.index[target] for target in targets}
+        remaining = set(goals)
+        best = {source: 0.0}
+        previous = {source: -1}
+        to_visit = [(0.0, source)]
+
+        while to_visit and remaining:
+            start_distance, current = heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            remaining.discard(current)
+            if current != source and blocked[kind[current]]:
+                continue
+
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0:
                     continue
-                if self.nodes[f"{key_node_id}"].type.name == KEY_TYPES.STREET:
+                if blocked[kind[neighbor]] and neighbor not in goals:
                     continue
-                if self.nodes[f"{key_node_id}"].type.name == KEY_TYPES.ELEVATOR:
+                distance = start_distance + cost[pos]
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = current
+                    heappush(to_visit, (distance, neighbor))
+        return best, previous
+
+    def __leg(
+        self,
+        source_node: int,
+        targets: typing.Iterable[int],
+        blocked: bytes,
+        model: CostModel,
+    ) -> tuple[dict, typing.Callable[[int], list[int]]]:
+        if self.app.config.map.route_engine == "contraction":
+            found = self.__contracted(source_node, targets, blocked, model)
+            if found is not None:
+                return found
+        if self.app.config.map.route_engine == "bidirectional":
+            return self.__paired(source_node, targets, blocked, model)
+        if (
+            blocked is BUILDING_BLOCKED
+            and self.app.config.map.route_planner == "hierarchical"
+        ):
+            return self.__plan(
+                source_node, {self.graph.index[target] for target in targets}, model
+            )
+        best, previous = self.__tree(source_node, targets, blocked, model)
+        return best, functools.partial(self.__walk, previous)
+
+    def __contracted(
+        self,
+        source_node: int,
+        targets: typing.Iterable[int],
+        blocked: bytes,
+        model: CostModel,
+    ) -> tuple[dict, typing.Callable[[int], list[int]]] | None:
+        graph = self.graph
+        contraction = self.__contraction(blocked, model)
+        source = graph.index[source_node]
+        if source not in contraction:
+            return None
+        cost = graph.column(model)
+        best = dict()
+        paths = dict()
+        for target_node in targets:
+            target = graph.index[target_node]
+            if target in contraction:
+                entries = [(target, 0.0)]
+            elif blocked[graph.kind[target]]:
+                entries = [
+                    (neighbor, cost[pos])
+                    for neighbor, pos in graph.neighbors(target)
+                    if neighbor in contraction
+                ]
+            else:
+                entries = list()
+            for entry, step in entries:
+                found = contraction.query(graph, model, source, entry)
+                if found is None or found[0] + step >= best.get(target, math.inf):
                     continue
+                best[target] = found[0] + step
+                paths[target] = found[1] if entry == target else found[1] + [target]
+            if target == source:
+                best[target] = 0.0
+                paths[target] = [source]
 
-                if elem := next(
-                    (
-                        element
-                        for element in to_visit
-                        if element.current.id == int(key_node_id)
-                    ),
-                    None,
-                ):
-                    if (
-                        current_node.start_distance + conn_value.distance
-                        < elem.start_distance
-                    ):
-                        elem.start_distance = (
-                            current_node.start_distance + conn_value.distance
-                        )
-                        elem.previous = current_node
+        def walk(goal: int) -> list[int]:
+            return paths[goal][::-1]
+
+        return best, walk
+
+    def __paired(
+        self,
+        source_node: int,
+        targets: typing.Iterable[int],
+        blocked: bytes,
+        model: CostModel,
+    ) -> tuple[dict, typing.Callable[[int], list[int]]]:
+        index = self.graph.index
+        best = dict()
+        paths = dict()
+        for target_node in targets:
+            found = self.__bidirectional(source_node, target_node, blocked, model)
+            if found is not None:
+                best[index[target_node]] = found["length"]
+                paths[index[target_node]] = [
+                    index[route_node.id] for route_node in found["result"]
+                ]
+
+        def walk(goal: int) -> list[int]:
+            return paths[goal][::-1]
+
+        return best, walk
+
+    def __contraction(self, blocked: bytes, model: CostModel) -> ContractionIndex:
+        contraction = self.contractions.setdefault(blocked, ContractionIndex(blocked))
+        if contraction.structure_dirty:
+            started = time.perf_counter()
+            self.graph.build()
+            contraction.build(self.graph)
+            self.logger.info(
+                "contraction order built in %.3fs: %d nodes, %d arcs",
+                time.perf_counter() - started,
+                len(contraction.order),
+                len(contraction.up_target),
+            )
+        if model.key not in contraction.weights or model.key in contraction.weights_dirty:
+            started = time.perf_counter()
+            contraction.customize(self.graph, model)
+            self.logger.info(
+                "%s contraction weights customized in %.3fs",
+                model.name,
+                time.perf_counter() - started,
+            )
+        return contraction
+
+    def __plan(self, source_node: int, goals: set[int], model: CostModel):
+        hierarchy = self.__refresh_hierarchy(model)
+        return hierarchy.search(
+            self.graph,
+            self.graph.column(model),
+            BUILDING_BLOCKED,
+            self.graph.index[source_node],
+            goals,
+        )
+
+    def __floor_of(self, idx: int) -> int:
+        return self.ancestors.floor_of(idx)
+
+    def __refresh_hierarchy(self, model: CostModel) -> Hierarchy:
+        hierarchy = self.hierarchies.setdefault(model.key, Hierarchy())
+        if not hierarchy.structure_dirty and not hierarchy.dirty:
+            return hierarchy
+        started = time.perf_counter()
+        self.graph.build()
+        if hierarchy.structure_dirty:
+            hierarchy.build_cells(
+                self.graph,
+                self.__floor_of,
+                {self.graph.index[exit_id] for exit_id in self.exits_list},
+                BUILDING_BLOCKED,
+            )
+        cells = len(hierarchy.dirty)
+        hierarchy.refresh(self.graph, self.graph.column(model), BUILDING_BLOCKED)
+        self.logger.info(
+            "%s floor hierarchy refreshed in %.3fs: %d cells, %d portals",
+            model.name,
+            time.perf_counter() - started,
+            cells,
+            len(hierarchy.links),
+        )
+        return hierarchy
+
+    def __walk(self, previous: dict, current: int) -> list[int]:
+        result = list()
+        while current != -1:
+            result.append(current)
+            current = previous[current]
+        return result
+
+    def __touches_street(self, *node_ids: int) -> bool:
+        for node_id in node_ids:
+            if node_id in self.exits_list:
+                return True
+            if self.graph.kind[self.graph.index[node_id]] in (KIND_STREET, KIND_DOOR):
+                return True
+        return False
+
+    def __changed(
+        self, *node_ids: int, street: bool = False, weights_only: bool = False
+    ) -> None:
+        self.version += 1
+        changes = ChangeSet() if self.changes is None else self.changes
+        changes.add(
+            {self.__building_id(node_id) for node_id in node_ids},
+            [self.graph.index[node_id] for node_id in node_ids],
+            street or self.__touches_street(*node_ids),
+            weights_only,
+        )
+        if self.changes is None:
+            self.__invalidate(changes)
+        return None
+
+    def __invalidate(self, changes: ChangeSet) -> None:
+        for hierarchy in self.hierarchies.values():
+            if changes.structure:
+                hierarchy.structure_dirty = True
+            else:
+                hierarchy.dirty.update(hierarchy.cell_of(idx) for idx in changes.weighted)
+        if changes.structure or changes.weights:
+            for transfers in self.transfers.values():
+                transfers.dirty = True
+        for contraction in self.contractions.values():
+            if changes.structure:
+                contraction.structure_dirty = True
+            elif changes.weights:
+                contraction.invalidate_weights()
+        if changes.street:
+            for exit_table in self.exit_tables.values():
+                exit_table.dirty = True
+        self.route_cache.invalidate(changes.buildings)
+        return None
+
+    @contextlib.contextmanager
+    def batch(self):
+        with self.lock:
+            if self.changes is not None:
+                yield self
+                return
+            self.changes = ChangeSet()
+            try:
+                yield self
+            finally:
+                changes, self.changes = self.changes, None
+                self.__invalidate(changes)
+
+    def __refresh_exits(self, model: CostModel) -> ExitTable:
+        exit_table = self.exit_tables.setdefault(model.key, ExitTable())
+        if not exit_table.dirty:
+            return exit_table
+        started = time.perf_counter()
+        exits = {exit_id: self.graph.index[exit_id] for exit_id in self.exits_list}
+        exit_table.clear(exits)
+        for exit_id in exits:
+            best, previous = self.__tree(exit_id, exits, STREET_BLOCKED, model)
+            exit_table.add_tree(exit_id, best, previous)
+        exit_table.dirty = False
+        self.logger.info(
+            "%s exit table built in %.3fs: %d exits, %d pairs",
+            model.name,
+            time.perf_counter() - started,
+            len(exits),
+            len(exit_table.distances),
+        )
+        return exit_table
+
+    def prepare(self) -> None:
+        with self.lock:
+            self.graph.build()
+            self.__refresh_exits(SHORTEST)
+            if self.app.config.map.route_planner == "hierarchical":
+                self.__refresh_hierarchy(SHORTEST)
+            if self.app.config.map.route_engine == "contraction":
+                self.__contraction(BUILDING_BLOCKED, SHORTEST)
+                self.__contraction(STREET_BLOCKED, SHORTEST)
+        return None
+
+    def route_ids(
+        self,
+        start_node: int,
+        target_node: int,
+        model: CostModel,
+        elevator: str = Lift_Weight.AVOID,
+    ) -> list[int] | None:
+        with self.lock:
+            model = self.__profiled(model).lifted(elevator)
+            kor_s = self.__korpus(start_node)
+            kor_t = self.__korpus(target_node)
+            return self.__route(
+                start_node, target_node, kor_s, kor_t, model, elevator=elevator
+            )
+
+    def many_route_ids(
+        self, start_node: int, target_nodes: list[int], model: CostModel
+    ) -> list[list[int] | None]:
+        with self.lock:
+            model = self.__profiled(model).lifted(model.elevator)
+            kor_s = self.__korpus(start_node)
+            pending = [
+                (target_node, self.__korpus(target_node)) for target_node in target_nodes
+            ]
+            goals = set()
+            for target_node, kor_t in pending:
+                if kor_t == kor_s:
+                    goals.add(target_node)
+                elif kor_s is None:
+                    goals.update(self.exits.get(kor_t.id, ()))
                 else:
-                    heapq.heappush(
-                        to_visit,
-                        RouteNode(
-                            self.__calculate_distance(
-                                self.nodes[f"{key_node_id}"], target
-                            ),
-                            current_node.start_distance + conn_value.distance,
-                            self.nodes[f"{key_node_id}"],
-                            current_node,
-                        ),
-                    )
+                    goals.update(self.exits.get(kor_s.id, ()))
+            if kor_s is None:
+                blocked = STREET_BLOCKED
+            elif model.elevator == Lift_Weight.AVOID:
+                blocked = BUILDING_BLOCKED
+            else:
+                blocked = LIFT_BLOCKED
+            source = self.__tree(start_node, goals, blocked, model)
+            return [
+                self.__route(
+                    start_node,
+                    target_node,
+                    kor_s,
+                    kor_t,
+                    model,
+                    source,
+                    elevator=model.elevator,
+                )
+                for target_node, kor_t in pending
+            ]
+
+    def nearest_ids(
+        self, start_node: int, type_id: int, limit: int, model: CostModel
+    ) -> list[tuple[int, float, list[int]]]:
+        with self.lock:
+            model = self.__profiled(model)
+            graph = self.graph
+            goals = set()
+            family = [type_id]
+            while family:
+                nodetype = self.types[family.pop()]
+                family.extend(nodetype.childrens)
+                goals.update(graph.index[node_id] for node_id in nodetype.proto)
+            if not goals or limit < 1:
+                return list()
+            best, previous, found = self.__nearest(
+                start_node,
+                goals,
+                limit,
+                (
+                    NEAREST_BLOCKED
+                    if model.elevator == Lift_Weight.AVOID
+                    else NEAREST_LIFT_BLOCKED
+                ),
+                model,
+            )
+            return [
+                (
+                    graph.ids[idx],
+                    best[idx],
+                    [graph.ids[step] for step in self.__walk(previous, idx)[::-1]],
+                )
+                for idx in found
+            ]
+
+    def nearest_point_ids(
+        self, x: float, y: float, z: float, limit: int
+    ) -> list[tuple[int, float]]:
+        with self.lock:
+            graph = self.graph
+            graph.build()
 
-    async def __navigate_street(self, start_node: int, target_node: int):
-        start = self.nodes[f"{start_node}"]
-        target = self.nodes[f"{target_node}"]
-
-        to_visit = []
-        visited = set()
-
-        heapq.heappush(
-            to_visit,
-            RouteNode(
-                target_distance=self.__calculate_distance(start, target),
-                start_distance=0,
-                node=start,
-                previous=-1,
-            ),
+            def routable(node_id: int) -> bool:
+                return next(graph.neighbors(graph.index[node_id]), None) is not None
+
+            if self.spatial is None:
+                self.spatial = SpatialIndex(self.app.config.map.spatial_cell)
+                for node_id in graph.index:
+                    self.__place(node_id)
+            return self.spatial.nearest(x, y, z, limit, routable)
+
+    def __profiled(self, model: CostModel) -> CostModel:
+        if model.profile is None:
+            return model
+        profile = self.profiles[model.profile.name]
+        if profile is not model.profile:
+            model = CostModel(
+                model.name,
+                model.distance,
+                model.time,
+                model.t_weight,
+                profile,
+                model.lift,
+            )
+        if profile.dirty:
+            started = time.perf_counter()
+            profile.refresh(self.graph, self.nodes)
+            for tables in (self.exit_tables, self.hierarchies, self.transfers):
+                for key in [key for key in tables if key[3:4] == (profile.name,)]:
+                    del tables[key]
+            for contraction in self.contractions.values():
+                for key in [
+                    key for key in contraction.weights if key[3:4] == (profile.name,)
+                ]:
+                    del contraction.weights[key]
+            self.logger.info(
+                "%s profile masks built in %.3fs",
+                profile.name,
+                time.perf_counter() - started,
+            )
+        return model
+
+    def __route_of(self, route_ids: list[int] | None) -> list[Node] | None:
+        if route_ids is None:
+            return None
+        route = [self.nodes.get(node_id) for node_id in route_ids]
+        if None in route:
+            return None
+        return route
+
+    async def navigate_main(
+        self,
+        start_node: int,
+        target_node: int,
+        model: CostModel = SHORTEST,
+        elevator: str | None = None,
+    ) -> list[Node] | None:
+        await self.__follow_shared()
+        elevator = elevator or model.elevator
+        key = (start_node, target_node, model.key, elevator)
+        route = self.route_cache.get(key)
+        if route is not None:
+            return route
+
+        route_ids, version = await self.executor.run(
+            self, "route_ids", start_node, target_node, model, elevator
         )
+        route = self.__route_of(route_ids)
+        self.__remember(key, route, version, start_node, target_node)
+        return route
 
-        while to_visit:
-            current_node = heapq.heappop(to_visit)
+    async def navigate_many(
+        self,
+        start_node: int,
+        target_nodes: typing.Iterable[int],
+        model: CostModel = SHORTEST,
+    ) -> typing.AsyncIterator[tuple[int, list[Node] | None]]:
+        await self.__follow_shared()
+        pending = list()
+        for target_node in target_nodes:
+            route = self.route_cache.get(
+                (start_node, target_node, model.key, model.elevator)
+            )
+            if route is not None:
+                yield target_node, route
+            else:
+                pending.append(target_node)
+        if not pending:
+            return
 
-            if current_node.current.id == target.id:
-                result = list()
-                length = current_node.start_distance
-                while current_node.previous != -1:
-                    result.append(current_node.current)
-                    current_node = current_node.previous
-                return {"result": result[::-1], "length": length}
+        routes, version = await self.executor.run(
+            self, "many_route_ids", start_node, pending, model
+        )
+        for target_node, route_ids in zip(pending, routes):
+            route = self.__route_of(route_ids)
+            self.__remember(
+                (start_node, target_node, model.key, model.elevator),
+                route,
+                version,
+                start_node,
+                target_node,
+            )
+            yield target_node, route
 
-            visited.add(current_node.current.id)
+    async def nearest_point(self, x: float, y: float, z: float, limit: int) -> list:
+        await self.__follow_shared()
+        found, _ = await self.executor.run(self, "nearest_point_ids", x, y, z, limit)
+        return [
+            {"node": self.nodes[node_id], "distance": distance}
+            for node_id, distance in found
+            if node_id in self.nodes
+        ]
 
-            for key_node_id, conn_value in current_node.current.conns.items():
-                if int(key_node_id) in visited:
+    async def nearest_of_type(
+        self, start_node: int, type_id: int, limit: int, model: CostModel = SHORTEST
+    ) -> list:
+        await self.__follow_shared()
+        results, _ = await self.executor.run(
+            self, "nearest_ids", start_node, type_id, limit, model
+        )
+        nearest = list()
+        for node_id, distance, route_ids in results:
+            route = self.__route_of(route_ids)
+            if route is not None:
+                nearest.append({"node": route[-1], "distance": distance, "route": route})
+        return nearest
+
+    def __nearest(
+        self, start_node: int, goals: set, limit: int, blocked: bytes, model: CostModel
+    ):
+        graph = self.graph
+        graph.build()
+        source = graph.index[start_node]
+        offsets = graph.offsets
+        adj = graph.adj
+        cost = graph.column(model)
+        kind = graph.kind
+        heappush = heapq.heappush
+        heappop = heapq.heappop
+
+        best = {source: 0.0}
+        previous = {source: -1}
+        to_visit = [(0.0, source)]
+        found = list()
+
+        while to_visit:
+            start_distance, current = heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            if current in goals:
+                found.append(current)
+                if len(found) == limit:
+                    break
+            if current != source and blocked[kind[current]]:
+                continue
+
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0:
                     continue
-                if (
-                    self.nodes[f"{key_node_id}"].type.name != KEY_TYPES.STREET
-                    or self.nodes[f"{key_node_id}"].type.name != KEY_TYPES.DOOR
-                ):
+                if blocked[kind[neighbor]] and neighbor not in goals:
                     continue
+                distance = start_distance + cost[pos]
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = current
+                    heappush(to_visit, (distance, neighbor))
+        return best, previous, found
 
-                if elem := next(
-                    (
-                        element
-                        for element in to_visit
-                        if element.current.id == int(key_node_id)
-                    ),
-                    None,
-                ):
-                    if (
-                        current_node.start_distance + conn_value.distance
-                        < elem.start_distance
-                    ):
-                        elem.start_distance = (
-                            current_node.start_distance + conn_value.distance
-                        )
-                        elem.previous = current_node
-                else:
-                    heapq.heappush(
-                        to_visit,
-                        RouteNode(
-                            self.__calculate_distance(
-                                self.nodes[f"{key_node_id}"], target
-                            ),
-                            current_node.start_distance + conn_value.distance,
-                            self.nodes[f"{key_node_id}"],
-                            current_node,
-                        ),
-                    )
-
-    async def __navigate_building_elevator(self, start_node: int, target_node: int):
+    def __remember(
+        self, key: tuple, route: list[Node] | None, version: int, start: int, target: int
+    ) -> None:
+        if route is None or version != self.version:
+            return None
+        try:
+            kor_s = self.__korpus(start)
+            kor_t = self.__korpus(target)
+        except KeyError:
+            return None
+        buildings = {kor_s.id if kor_s else None, kor_t.id if kor_t else None}
+        if kor_s != kor_t:
+            buildings.add(None)
+        with self.route_cache.lock:
+            if version == self.version:
+                self.route_cache.put(key, route, buildings)
         return None
 
-    async def navigate_main(self, start_node: int, target_node: int):
-        start = self.nodes[f"{start_node}"]
-        target = self.nodes[f"{target_node}"]
-
-        kor_s = await self.__go_up(KEY_TYPES.KORPUS, start)
-        kor_t = await self.__go_up(KEY_TYPES.KORPUS, target)
+    def __direct(
+        self, start_node: int, target_node: int, blocked: bytes, model: CostModel
+    ) -> list[int] | None:
+        target = self.graph.index[target_node]
+        best, walk = self.__leg(start_node, (target_node,), blocked, model)
+        if target not in best:
+            return None
+        return [self.graph.ids[idx] for idx in walk(target)[::-1]]
 
+    def __route(
+        self,
+        start_node: int,
+        target_node: int,
+        kor_s: Node | None,
+        kor_t: Node | None,
+        model: CostModel,
+        source: tuple[dict, dict] | None = None,
+        elevator: str = Lift_Weight.AVOID,
+    ) -> list[int] | None:
+        graph = self.graph
+        if kor_s == kor_t and source is not None:
+            best_s, previous_s = source
+            target = graph.index[target_node]
+            if target not in best_s:
+                return None
+            return [graph.ids[idx] for idx in self.__walk(previous_s, target)[::-1]]
+        if kor_s is None and kor_t is None:
+            if self.app.config.map.route_engine == "contraction":
+                return self.__direct(start_node, target_node, STREET_BLOCKED, model)
+            result = self.__navigate_street(start_node, target_node, model)
+            return [route_node.id for route_node in result["result"]] if result else None
         if kor_s == kor_t:
-            result = await self.__navigate_building(start_node, target_node)
-            return result["result"]
-        elif kor_s is None:
-            if kor_t is None:
-                result = await self.__navigate_street(start_node, target_node)
-                return result["result"]
-            else:
-                entrances = self.exits[f"{kor_t.id}"]
-                best_street_route = None
-                route_length = -1
-                optimal_entrance = -1
-                for key in entrances:
-                    temp_result = await self.__navigate_street(start_node, int(key))
-                    if optimal_entrance == -1 or temp_result < route_length:
-                        best_street_route = temp_result["result"]
-                        route_length = temp_result.length
-                        optimal_entrance = int(key)
-                building_route = await self.__navigate_building(
-                    optimal_entrance, target_node
+            if elevator != Lift_Weight.AVOID:
+                result = self.__navigate_building_elevator(
+                    start_node, target_node, model, elevator
+                ) or self.__astar(start_node, target_node, LIFT_BLOCKED, model)
+                return (
+                    [route_node.id for route_node in result["result"]] if result else None
                 )
-                return best_street_route[:-1] + building_route["result"]
-        elif kor_t is None:
-            exits = self.exits[f"{kor_s.id}"]
-            best_street_route = None
-            route_length = -1
-            optimal_exit = -1
-            for key in exits:
-                temp_result = await self.__navigate_street(int(key), target_node)
-                if optimal_exit == -1 or temp_result < route_length:
-                    best_street_route = temp_result["result"]
-                    route_length = temp_result.length
-                    optimal_exit = int(key)
-            building_route = await self.__navigate_building(start_node, optimal_exit)
-            return building_route["result"][:-1] + best_street_route
+            if (
+                self.app.config.map.route_engine == "contraction"
+                or self.app.config.map.route_planner == "hierarchical"
+            ):
+                return self.__direct(start_node, target_node, BUILDING_BLOCKED, model)
+            result = None
+            if self.app.config.map.route_engine == "astar":
+                result = self.__navigate_building_elevator(
+                    start_node, target_node, model, elevator
+                )
+            result = result or self.__navigate_building(start_node, target_node, model)
+            return [route_node.id for route_node in result["result"]] if result else None
+
+        inside = BUILDING_BLOCKED if elevator == Lift_Weight.AVOID else LIFT_BLOCKED
+        if source is not None:
+            best_s, previous_s = source
+            walk_s = functools.partial(self.__walk, previous_s)
+        elif kor_s is None:
+            best_s, walk_s = self.__leg(
+                start_node, self.exits.get(kor_t.id, ()), STREET_BLOCKED, model
+            )
+        else:
+            best_s, walk_s = self.__leg(
+                start_node, self.exits.get(kor_s.id, ()), inside, model
+            )
+        if kor_t is None:
+            best_t, walk_t = self.__leg(
+                target_node, self.exits.get(kor_s.id, ()), STREET_BLOCKED, model
+            )
         else:
-            exits_s = self.exits[f"{kor_s.id}"]
-            exits_t = self.exits[f"{kor_t.id}"]
-            best_street_route = None
-            route_length = -1
-            optimal_exit_s = -1
-            optimal_exit_t = -1
-            for key_s in exits_s:
-                for key_t in exits_t:
-                    temp_result = await self.__navigate_street(int(key_s), int(key_t))
-                if optimal_exit_s == -1 or temp_result < route_length:
-                    best_street_route = temp_result["result"]
-                    route_length = temp_result.length
-                    optimal_exit_s = int(key_s)
-                    optimal_exit_t = int(key_t)
-            building_route_s = await self.__navigate_building(start_node, optimal_exit_s)
-            building_route_t = await self.__navigate_building(optimal_exit_t, target_node)
-            return building_route_s["result"][:-1] + best_street_route["result"][:-1] + building_route_t
+            best_t, walk_t = self.__leg(
+                target_node, self.exits.get(kor_t.id, ()), inside, model
+            )
+
+        route = None
+        length = math.inf
+        if kor_s is None or kor_t is None:
+            for exit_id in self.exits.get(kor_s.id if kor_t is None else kor_t.id, ()):
+                exit_index = graph.index[exit_id]
+                if exit_index not in best_s or exit_index not in best_t:
+                    continue
+                if best_s[exit_index] + best_t[exit_index] < length:
+                    length = best_s[exit_index] + best_t[exit_index]
+                    route = walk_s(exit_index)[::-1] + walk_t(exit_index)[1:]
+        else:
+            exit_table = self.__refresh_exits(model)
+            for exit_s in self.exits.get(kor_s.id, ()):
+                head = best_s.get(graph.index[exit_s])
+                if head is None:
+                    continue
+                for exit_t in self.exits.get(kor_t.id, ()):
+                    tail = best_t.get(graph.index[exit_t])
+                    street = exit_table.distance(exit_s, exit_t)
+                    if tail is None or street is None:
+                        continue
+                    if head + street + tail < length:
+                        length = head + street + tail
+                        route = (exit_s, exit_t)
+            if route is not None:
+                exit_s, exit_t = route
+                route = (
+                    walk_s(graph.index[exit_s])[::-1]
+                    + exit_table.path(exit_s, exit_t)[1:-1]
+                    + walk_t(graph.index[exit_t])
+                )
+        if route is None:
+            return None
+        return [graph.ids[idx] for idx in route]
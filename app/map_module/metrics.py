@@ -0,0 +1,47 @@
+import math
+from collections import deque
+
+
+class LatencyMeter:
+
+    def __init__(self, window: int = 10000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        self.samples.append(seconds)
+        self.count += 1
+
+    def percentile(self, percent: float) -> float | None:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        rank = max(0, math.ceil(percent / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+    def stats(self) -> dict:
+        result = {"count": self.count, "window": len(self.samples)}
+        for percent in (50, 99):
+            value = self.percentile(percent)
+            result[f"p{percent}_ms"] = None if value is None else round(value * 1000, 3)
+        return result
+
+
+class ExpansionCounter:
+
+    def __init__(self):
+        self.searches = 0
+        self.forward = 0
+        self.backward = 0
+
+    def add(self, forward: int, backward: int) -> None:
+        self.searches += 1
+        self.forward += forward
+        self.backward += backward
+
+    def stats(self) -> dict:
+        return {
+            "searches": self.searches,
+            "forward": self.forward,
+            "backward": self.backward,
+        }
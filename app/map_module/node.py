@@ -2,17 +2,14 @@ class NodeType:
 
     def __init__(self, id: int, name: str, **kwargs):
         self.id = id
-        if kwargs:
-            if kwargs.get("parent"):
-                self.parent = kwargs.get("parent")
-            else:
-                self.parent = None
+        self.parent = kwargs.get("parent")
         self.name = name
         self.childrens = []
         self.proto = []
 
 
 class Node:
+    __slots__ = ("id", "parent", "type", "x", "y", "z", "depth", "childrens", "name")
 
     def __init__(
         self,
@@ -26,16 +23,11 @@ class Node:
         **kwargs,
     ):
         self.id = id
-        if kwargs:
-            if kwargs.get("parent"):
-                self.parent = kwargs.get("parent")
-            else:
-                self.parent = None
+        self.parent = kwargs.get("parent")
         self.type = typeNode
         self.x = x
         self.y = y
         self.z = z
-        self.conns = dict()
         self.depth = depth
         self.childrens = []
         self.name = name
@@ -43,27 +35,8 @@ class Node:
     def __lt__(self, other):
         return self.id < other.id
 
+    def __eq__(self, other):
+        return isinstance(other, Node) and self.id == other.id
 
-class Connection:
-
-    def __init__(self, id: int, distance: float, time: float, t_weight: float):
-        self.id = id
-        self.distance = distance
-        self.time = time
-        self.t_weight = t_weight
-
-
-class RouteNode:
-
-    def __init__(
-        self, target_distance: float, start_distance: float, node: Node, previous
-    ):
-        self.target_distance = target_distance
-        self.start_distance = start_distance
-        self.current = node
-        self.previous = previous
-
-    def __lt__(self, other):
-        if self.target_distance+self.start_distance != other.target_distance+self.start_distance:
-            return self.target_distance+self.start_distance < other.target_distance+self.start_distance
-        return self.current < other.current
+    def __hash__(self):
+        return hash(self.id)
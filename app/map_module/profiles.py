@@ -0,0 +1,80 @@
+import math
+from array import array
+
+from app.map_module.dataclasses import KEY_TYPES, Lift_Weight
+
+
+class Profile:
+    """Node type filter and edge multipliers of one group of users.
+
+    A type matches a rule when it or one of its parent types is named in it.
+    With ``allow`` set only matching types may be crossed, ``forbid`` always
+    wins. ``factor`` holds one precomputed multiplier per graph index, infinite
+    for forbidden nodes, and an edge costs its cost model weight times the
+    larger factor of its two ends, so searches need no per-relaxation check.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        allow: list[str] | None = None,
+        forbid: list[str] | None = None,
+        multipliers: dict[str, float] | None = None,
+        elevator: str = Lift_Weight.AVOID,
+    ):
+        self.name = name
+        self.allow = set(allow or ())
+        self.forbid = set(forbid or ())
+        self.multipliers = dict(multipliers or {})
+        self.elevator = elevator
+        self.factor = array("d")
+        self.revision = 0
+        self.dirty = True
+
+    def __getstate__(self) -> dict:
+        state = dict(self.__dict__)
+        state["factor"] = array("d")
+        state["dirty"] = True
+        return state
+
+    def type_factor(self, nodetype) -> float:
+        allowed = not self.allow
+        factor = None
+        current = nodetype
+        while current is not None:
+            if current.name in self.forbid:
+                return math.inf
+            if current.name in self.allow:
+                allowed = True
+            if factor is None and current.name in self.multipliers:
+                factor = float(self.multipliers[current.name])
+            current = current.parent
+        if not allowed:
+            return math.inf
+        return 1.0 if factor is None else factor
+
+    def refresh(self, graph, nodes) -> None:
+        by_type = dict()
+        factor = array("d", [1.0]) * len(graph.ids)
+        for idx, node_id in enumerate(graph.ids):
+            if node_id < 0:
+                continue
+            nodetype = nodes[node_id].type
+            if nodetype.id not in by_type:
+                by_type[nodetype.id] = self.type_factor(nodetype)
+            factor[idx] = by_type[nodetype.id]
+        self.factor = factor
+        self.revision += 1
+        self.dirty = False
+        return None
+
+    def edge_factor(self, u: int, v: int) -> float:
+        return max(self.factor[u], self.factor[v])
+
+
+def default_profiles() -> dict[str, Profile]:
+    return {
+        "step_free": Profile(
+            "step_free", forbid=[KEY_TYPES.STAIRS], elevator=Lift_Weight.ALLOW
+        ),
+    }
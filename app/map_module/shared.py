@@ -0,0 +1,100 @@
+import bisect
+import typing
+
+from app.map_module.node import Node, NodeType
+
+if typing.TYPE_CHECKING:
+    from app.map_module.snapshot import Snapshot
+
+
+class SharedIndex:
+    """Node id -> graph index lookup over the sorted id sections of a snapshot."""
+
+    def __init__(self, snapshot: "Snapshot"):
+        self.ids = snapshot["id_sorted"]
+        self.slots = snapshot["id_slot"]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __position(self, node_id: int) -> int:
+        position = bisect.bisect_left(self.ids, node_id)
+        if position < len(self.ids) and self.ids[position] == node_id:
+            return position
+        return -1
+
+    def __contains__(self, node_id: int) -> bool:
+        return self.__position(node_id) >= 0
+
+    def __getitem__(self, node_id: int) -> int:
+        position = self.__position(node_id)
+        if position < 0:
+            raise KeyError(node_id)
+        return self.slots[position]
+
+    def get(self, node_id: int, default=None):
+        position = self.__position(node_id)
+        return default if position < 0 else self.slots[position]
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return iter(self.ids)
+
+
+class SharedNodes:
+    """Read-only ``Map.nodes`` over a snapshot.
+
+    ``Node`` objects are built on access together with their parent chain and
+    are not kept, so a worker holds no per-node Python objects of its own.
+    """
+
+    def __init__(self, snapshot: "Snapshot", types: dict[int, NodeType]):
+        self.types = types
+        self.index = SharedIndex(snapshot)
+        self.rows = snapshot["idx_row"]
+        self.node_ids = snapshot["node_id"]
+        self.parents = snapshot["node_par"]
+        self.type_ids = snapshot["node_typ"]
+        self.x = snapshot["node_x"]
+        self.y = snapshot["node_y"]
+        self.z = snapshot["node_z"]
+        self.names = snapshot["names"]
+        self.name_offsets = snapshot["node_nam"]
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __contains__(self, node_id: int) -> bool:
+        return node_id in self.index
+
+    def __iter__(self) -> typing.Iterator[int]:
+        return iter(self.index)
+
+    def __getitem__(self, node_id: int) -> Node:
+        row = self.rows[self.index[node_id]]
+        chain = [row]
+        while self.parents[chain[-1]] >= 0:
+            chain.append(self.rows[self.index[self.parents[chain[-1]]]])
+        parent = None
+        for depth, row in enumerate(reversed(chain), start=1):
+            parent = Node(
+                id=self.node_ids[row],
+                typeNode=self.types[self.type_ids[row]],
+                x=self.x[row],
+                y=self.y[row],
+                z=self.z[row],
+                depth=depth,
+                name=bytes(
+                    self.names[self.name_offsets[row] : self.name_offsets[row + 1]]
+                ).decode(),
+                parent=parent,
+            )
+        return parent
+
+    def get(self, node_id: int, default=None):
+        if node_id not in self.index:
+            return default
+        return self[node_id]
+
+    def values(self) -> typing.Iterator[Node]:
+        for node_id in self.index:
+            yield self[node_id]
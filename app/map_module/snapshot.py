@@ -0,0 +1,260 @@
+import argparse
+import asyncio
+import mmap
+import os
+import struct
+import typing
+from array import array
+from collections import namedtuple
+
+if typing.TYPE_CHECKING:
+    from app.map_module.mapper import Map
+
+
+from app.map_module.graph import GRAPH_ARRAYS
+
+
+MAGIC = b"BMNAVSNP"
+FORMAT = 4
+HEADER = struct.Struct("<8sIIq")
+SECTION = struct.Struct("<24s4sqq")
+
+TypeRow = namedtuple("TypeRow", "id parent_id name")
+NodeRow = namedtuple("NodeRow", "id parent_id type_id name x_cord y_cord z_cord")
+ConnRow = namedtuple("ConnRow", "id node1_id node2_id distance time t_weight")
+
+
+def write_snapshot(path: str, navigator: "Map", marker: int) -> int:
+    """Dump the loaded map into a flat file of typed sections.
+
+    Every section is a plain native-order array, so ``Snapshot`` reads the
+    file through ``mmap`` without unpacking it first. Besides the rows needed
+    to replay the map, the built CSR graph and the ancestor table are stored
+    as is for ``Map.attach``.
+    """
+    graph = navigator.graph
+    graph.build()
+    names = bytearray()
+    sections = dict()
+
+    def name_offsets(values) -> array:
+        offsets = array("q", [len(names)])
+        for value in values:
+            names.extend(value.encode())
+            offsets.append(len(names))
+        return offsets
+
+    types = list(navigator.types.values())
+    sections["type_id"] = array("q", (nodetype.id for nodetype in types))
+    sections["type_par"] = array(
+        "q", (-1 if nodetype.parent is None else nodetype.parent.id for nodetype in types)
+    )
+    sections["type_nam"] = name_offsets(nodetype.name for nodetype in types)
+
+    nodes = list(navigator.nodes.values())
+    sections["node_id"] = array("q", (node.id for node in nodes))
+    sections["node_par"] = array(
+        "q", (-1 if node.parent is None else node.parent.id for node in nodes)
+    )
+    sections["node_typ"] = array("q", (node.type.id for node in nodes))
+    sections["node_x"] = array("d", (node.x for node in nodes))
+    sections["node_y"] = array("d", (node.y for node in nodes))
+    sections["node_z"] = array("d", (node.z for node in nodes))
+    sections["node_nam"] = name_offsets(node.name for node in nodes)
+
+    slots = [slot for slot in range(len(graph.edge_ids)) if graph.edge_ids[slot] >= 0]
+    sections["conn_id"] = array("q", (graph.edge_ids[slot] for slot in slots))
+    sections["conn_n1"] = array("q", (graph.ids[graph.edge_u[slot]] for slot in slots))
+    sections["conn_n2"] = array("q", (graph.ids[graph.edge_v[slot]] for slot in slots))
+    sections["conn_dis"] = array("d", (graph.distance[slot] for slot in slots))
+    sections["conn_tim"] = array("d", (graph.time[slot] for slot in slots))
+    sections["conn_wei"] = array("d", (graph.t_weight[slot] for slot in slots))
+    sections["names"] = array("B", names)
+
+    for name in GRAPH_ARRAYS:
+        values = getattr(graph, name)
+        sections[f"graph.{name}"] = (
+            array("B", values) if isinstance(values, bytearray) else values
+        )
+    rows = array("q", [-1]) * len(graph.ids)
+    for row, node in enumerate(nodes):
+        rows[graph.index[node.id]] = row
+    sections["idx_row"] = rows
+    sorted_ids = sorted(graph.index)
+    sections["id_sorted"] = array("q", sorted_ids)
+    sections["id_slot"] = array("q", (graph.index[node_id] for node_id in sorted_ids))
+    for name, values in (
+        ("anc_bld", navigator.ancestors.building),
+        ("anc_flr", navigator.ancestors.floor),
+    ):
+        values = array("q", values)
+        values.extend([-1] * (len(graph.ids) - len(values)))
+        sections[name] = values
+    exits = [
+        (kor_id, exit_id)
+        for kor_id, kor_exits in navigator.exits.items()
+        for exit_id in kor_exits
+    ]
+    sections["exit_kor"] = array("q", (kor_id for kor_id, _ in exits))
+    sections["exit_id"] = array("q", (exit_id for _, exit_id in exits))
+    sections["gap_id"] = array("q", sorted(navigator.gaps))
+
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = list()
+    for name, values in sections.items():
+        table.append(
+            SECTION.pack(name.encode(), values.typecode.encode(), offset, len(values))
+        )
+        offset += -(-len(values) * values.itemsize // 8) * 8
+
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(HEADER.pack(MAGIC, FORMAT, len(sections), marker))
+        for entry in table:
+            file.write(entry)
+        for values in sections.values():
+            data = values.tobytes()
+            file.write(data)
+            file.write(bytes(-len(data) % 8))
+        size = file.tell()
+    os.replace(temporary, path)
+    return size
+
+
+class Snapshot:
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.sections = dict()
+        magic, version, count, self.marker = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != FORMAT:
+            self.close()
+            raise ValueError(f"{path} is not a format {FORMAT} map snapshot")
+        view = memoryview(self.buffer)
+        for number in range(count):
+            name, typecode, offset, length = SECTION.unpack_from(
+                self.buffer, HEADER.size + SECTION.size * number
+            )
+            typecode = typecode.rstrip(b"\0").decode()
+            size = struct.calcsize(typecode) * length
+            self.sections[name.rstrip(b"\0").decode()] = view[
+                offset : offset + size
+            ].cast(typecode)
+        view.release()
+
+    def __getitem__(self, name: str) -> memoryview:
+        return self.sections[name]
+
+    def inode(self) -> int:
+        return os.fstat(self.file.fileno()).st_ino
+
+    def __names(self, section: str) -> typing.Iterator[str]:
+        names = self["names"]
+        offsets = self[section]
+        for number in range(len(offsets) - 1):
+            yield bytes(names[offsets[number] : offsets[number + 1]]).decode()
+
+    def type_rows(self) -> typing.Iterator[TypeRow]:
+        for type_id, parent_id, name in zip(
+            self["type_id"], self["type_par"], self.__names("type_nam")
+        ):
+            yield TypeRow(type_id, None if parent_id < 0 else parent_id, name)
+
+    def node_rows(self) -> typing.Iterator[NodeRow]:
+        for node_id, parent_id, type_id, name, x, y, z in zip(
+            self["node_id"],
+            self["node_par"],
+            self["node_typ"],
+            self.__names("node_nam"),
+            self["node_x"],
+            self["node_y"],
+            self["node_z"],
+        ):
+            yield NodeRow(
+                node_id, None if parent_id < 0 else parent_id, type_id, name, x, y, z
+            )
+
+    async def stream_types(self) -> typing.AsyncIterator[TypeRow]:
+        for row in self.type_rows():
+            yield row
+
+    async def stream_nodes(self) -> typing.AsyncIterator[NodeRow]:
+        for row in self.node_rows():
+            yield row
+
+    async def stream_connections(self) -> typing.AsyncIterator[ConnRow]:
+        for row in zip(
+            self["conn_id"],
+            self["conn_n1"],
+            self["conn_n2"],
+            self["conn_dis"],
+            self["conn_tim"],
+            self["conn_wei"],
+        ):
+            yield ConnRow(*row)
+
+    def close(self) -> None:
+        for section in self.sections.values():
+            section.release()
+        self.sections = dict()
+        self.buffer.close()
+        self.file.close()
+
+
+def read_snapshot(path: str) -> Snapshot | None:
+    if not os.path.exists(path):
+        return None
+    try:
+        return Snapshot(path)
+    except (ValueError, struct.error):
+        return None
+
+
+async def build(config_path: str, output: str | None, watch: float | None) -> None:
+    from app.map_module.mapper import Map
+    from app.web.app import setup_app
+
+    app = setup_app(config_path)
+    output = output or app.config.map.snapshot_path
+    if not output:
+        raise SystemExit("no output path: pass --output or set map.snapshot_path")
+    await app.database.connect()
+    try:
+        published = None
+        gaps = list()
+        while True:
+            marker = await app.store.mapAPI.get_change_marker()
+            if marker != published or await app.store.mapAPI.get_changes(marker, 1, gaps):
+                gaps = await app.store.mapAPI.get_missing_changes(
+                    marker, app.config.map.change_gap_window
+                )
+                navigator = Map(app)
+                await navigator.load(app.store.mapAPI)
+                navigator.follow_changes(marker, gaps)
+                size = write_snapshot(output, navigator, marker)
+                print(f"{output}: {size} bytes, change marker {marker}", flush=True)
+                published = marker
+            if watch is None:
+                break
+            await asyncio.sleep(watch)
+    finally:
+        await app.database.disconnect()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the map graph snapshot")
+    parser.add_argument("--config", default="config.yaml")
+    parser.add_argument("--output", default=None)
+    parser.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        help="keep running and republish when the change marker moves",
+    )
+    args = parser.parse_args()
+    asyncio.run(build(args.config, args.output, args.watch))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import heapq
+import math
+import typing
+
+
+class SpatialIndex:
+    """Grid buckets of node positions, one grid per floor.
+
+    Nodes outside any floor (streets, buildings) share the ``-1`` grid. Floor
+    height ranges and grid extents only ever grow, so after moves and
+    deletions they stay valid lower bounds for the search.
+    """
+
+    def __init__(self, cell: float):
+        self.cell = cell
+        self.grids = dict()
+        self.places = dict()
+        self.heights = dict()
+        self.extents = dict()
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def __bucket(self, x: float, y: float) -> tuple[int, int]:
+        return math.floor(x / self.cell), math.floor(y / self.cell)
+
+    def add(self, node_id: int, floor: int, x: float, y: float, z: float) -> None:
+        if node_id in self.places:
+            self.remove(node_id)
+        bucket = self.__bucket(x, y)
+        self.grids.setdefault(floor, dict()).setdefault(bucket, set()).add(node_id)
+        self.places[node_id] = (floor, bucket, x, y, z)
+        low, high = self.heights.get(floor, (z, z))
+        self.heights[floor] = (min(low, z), max(high, z))
+        extent = self.extents.get(floor, (bucket[0], bucket[1], bucket[0], bucket[1]))
+        self.extents[floor] = (
+            min(extent[0], bucket[0]),
+            min(extent[1], bucket[1]),
+            max(extent[2], bucket[0]),
+            max(extent[3], bucket[1]),
+        )
+        return None
+
+    def remove(self, node_id: int) -> None:
+        place = self.places.pop(node_id, None)
+        if place is None:
+            return None
+        floor, bucket = place[0], place[1]
+        members = self.grids[floor][bucket]
+        members.discard(node_id)
+        if not members:
+            del self.grids[floor][bucket]
+        return None
+
+    def nearest(
+        self,
+        x: float,
+        y: float,
+        z: float,
+        limit: int,
+        accept: typing.Callable[[int], bool],
+    ) -> list[tuple[int, float]]:
+        floors = list()
+        for floor, (low, high) in self.heights.items():
+            floors.append((max(low - z, z - high, 0.0), floor))
+        floors.sort()
+
+        found = list()
+        cx, cy = self.__bucket(x, y)
+        for height, floor in floors:
+            if len(found) == limit and height >= -found[0][0]:
+                break
+            grid = self.grids.get(floor)
+            if not grid:
+                continue
+            for ring, bucket in self.__order(grid, self.extents[floor], cx, cy):
+                bound = math.hypot(max(ring - 1, 0) * self.cell, height)
+                if len(found) == limit and bound >= -found[0][0]:
+                    break
+                for node_id in grid[bucket]:
+                    _, _, nx, ny, nz = self.places[node_id]
+                    distance = math.sqrt((nx - x) ** 2 + (ny - y) ** 2 + (nz - z) ** 2)
+                    if len(found) == limit and distance >= -found[0][0]:
+                        continue
+                    if not accept(node_id):
+                        continue
+                    if len(found) == limit:
+                        heapq.heapreplace(found, (-distance, node_id))
+                    else:
+                        heapq.heappush(found, (-distance, node_id))
+        return sorted(
+            ((node_id, -distance) for distance, node_id in found),
+            key=lambda item: item[1],
+        )
+
+    def __order(
+        self, grid: dict, extent: tuple, cx: int, cy: int
+    ) -> typing.Iterator[tuple[int, tuple[int, int]]]:
+        min_x, min_y, max_x, max_y = extent
+        reach = max(cx - min_x, max_x - cx, cy - min_y, max_y - cy)
+        ring = 0
+        while ring <= reach and (2 * ring + 1) ** 2 <= len(grid):
+            for bucket in self.__ring(cx, cy, ring):
+                if bucket in grid:
+                    yield ring, bucket
+            ring += 1
+        if ring <= reach:
+            yield from sorted(
+                (max(abs(bucket[0] - cx), abs(bucket[1] - cy)), bucket)
+                for bucket in grid
+                if max(abs(bucket[0] - cx), abs(bucket[1] - cy)) >= ring
+            )
+
+    @staticmethod
+    def __ring(cx: int, cy: int, ring: int) -> typing.Iterator[tuple[int, int]]:
+        if ring == 0:
+            yield cx, cy
+            return
+        for dx in range(-ring, ring + 1):
+            yield cx + dx, cy - ring
+            yield cx + dx, cy + ring
+        for dy in range(-ring + 1, ring):
+            yield cx - ring, cy + dy
+            yield cx + ring, cy + dy
@@ -0,0 +1,183 @@
+import heapq
+import math
+import typing
+from array import array
+
+
+class TransferTable:
+    """Floor-to-floor transfers of every building for one cost model.
+
+    A link is an edge between nodes on different floors, a flight of a
+    staircase or an elevator, and its ends are portals; a shaft is a connected
+    run of links. A multi-floor query walks its start floor, then runs
+    Dijkstra over the portals: a hop either takes one link or walks between
+    two portals of a floor, and the walks from every portal are kept until the
+    table is rebuilt. A route may change shafts on any floor on its way, and
+    its length is the one of the flat search over the same nodes. Elevator
+    waits are part of the elevator edges' ``t_weight`` and, like a preference
+    for elevators, enter the table through the cost model.
+    """
+
+    def __init__(self):
+        self.floor = array("q")
+        self.links = dict()
+        self.shaft = dict()
+        self.elevator = list()
+        self.walks = dict()
+        self.dirty = True
+
+    def build(
+        self,
+        graph,
+        cost,
+        floor_of: typing.Callable[[int], int],
+        blocked: bytes,
+        lifts: bytes,
+    ) -> None:
+        self.floor = array("q", (floor_of(idx) for idx in range(len(graph.ids))))
+        floor = self.floor
+        kind = graph.kind
+        adj = graph.adj
+        offsets = graph.offsets
+        links = dict()
+        for idx in range(len(floor)):
+            if floor[idx] < 0 or blocked[kind[idx]]:
+                continue
+            for pos in range(offsets[idx], offsets[idx + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0 or floor[neighbor] < 0 or floor[neighbor] == floor[idx]:
+                    continue
+                if blocked[kind[neighbor]]:
+                    continue
+                links.setdefault(idx, list()).append((neighbor, cost[pos]))
+
+        self.links = links
+        self.shaft = dict()
+        self.elevator = list()
+        self.walks = dict()
+        for idx in links:
+            if idx in self.shaft:
+                continue
+            number = len(self.elevator)
+            members = [idx]
+            self.shaft[idx] = number
+            for member in members:
+                for neighbor, _ in links[member]:
+                    if neighbor not in self.shaft:
+                        self.shaft[neighbor] = number
+                        members.append(neighbor)
+            self.elevator.append(any(lifts[kind[member]] for member in members))
+        self.dirty = False
+        return None
+
+    def walk(self, graph, cost, blocked: bytes, source: int) -> tuple[dict, dict]:
+        floor = self.floor
+        home = floor[source]
+        offsets = graph.offsets
+        adj = graph.adj
+        kind = graph.kind
+
+        best = {source: 0.0}
+        previous = {source: -1}
+        to_visit = [(0.0, source)]
+        while to_visit:
+            start_distance, current = heapq.heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            if current != source and blocked[kind[current]]:
+                continue
+            for pos in range(offsets[current], offsets[current + 1]):
+                neighbor = adj[pos]
+                if neighbor < 0 or floor[neighbor] != home:
+                    continue
+                distance = start_distance + cost[pos]
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = current
+                    heapq.heappush(to_visit, (distance, neighbor))
+        return best, previous
+
+    def search(
+        self,
+        graph,
+        cost,
+        blocked: bytes,
+        source: int,
+        target: int,
+    ) -> tuple[float, list[int]] | None:
+        floor = self.floor
+        kind = graph.kind
+        links = self.links
+        walks = self.walks.setdefault(blocked, dict())
+        home = floor[target]
+        best_s, previous_s = self.walk(graph, cost, blocked, source)
+        best_t, previous_t = self.walk(graph, cost, blocked, target)
+
+        best = dict()
+        previous = dict()
+        to_visit = list()
+        for portal, distance in best_s.items():
+            if portal not in links:
+                continue
+            if portal != source and blocked[kind[portal]]:
+                continue
+            best[portal] = distance
+            previous[portal] = (-1, False)
+            to_visit.append((distance, portal))
+        heapq.heapify(to_visit)
+
+        score = math.inf
+        choice = -1
+        while to_visit:
+            start_distance, current = heapq.heappop(to_visit)
+            if start_distance > best[current]:
+                continue
+            if start_distance >= score:
+                break
+            if floor[current] == home and current in best_t:
+                if start_distance + best_t[current] < score:
+                    score = start_distance + best_t[current]
+                    choice = current
+            if current not in walks:
+                walks[current] = self.walk(graph, cost, blocked, current)
+            hops = [
+                (neighbor, step, False)
+                for neighbor, step in walks[current][0].items()
+                if neighbor in links
+            ]
+            hops.extend((neighbor, step, True) for neighbor, step in links[current])
+            for neighbor, step, link in hops:
+                if neighbor == current:
+                    continue
+                if neighbor != target and blocked[kind[neighbor]]:
+                    continue
+                distance = start_distance + step
+                if distance < best.get(neighbor, math.inf):
+                    best[neighbor] = distance
+                    previous[neighbor] = (current, link)
+                    heapq.heappush(to_visit, (distance, neighbor))
+        if choice < 0:
+            return None
+
+        portals = list()
+        current = choice
+        while current != -1:
+            portals.append(current)
+            current = previous[current][0]
+        portals.reverse()
+        path = self.__chain(previous_s, portals[0])[::-1]
+        for current, neighbor in zip(portals, portals[1:]):
+            if previous[neighbor][1]:
+                path.append(neighbor)
+            else:
+                path += self.__chain(walks[current][1], neighbor)[::-1][1:]
+        path += self.__chain(previous_t, choice)[1:]
+        return score, path
+
+    @staticmethod
+    def __chain(previous: dict, current: int) -> list[int]:
+        result = list()
+        while current != -1:
+            result.append(current)
+            current = previous[current]
+        return result
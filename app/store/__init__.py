@@ -22,3 +22,6 @@ def setup_store(app: "Application"):
     app.on_startup.append(app.database.connect)
     app.on_cleanup.append(app.database.disconnect)
     app.store = Store(app)
+    app.on_startup.append(app.store.map.autostart)
+    app.on_shutdown.append(app.store.map.stop)
+    app.on_cleanup.append(app.store.map.executor.shutdown)
@@ -1,9 +1,13 @@
 import datetime
+from typing import AsyncIterator
+
 import sqlalchemy.exc
-from sqlalchemy import select, delete, update, or_
+from sqlalchemy.engine import Row
+from sqlalchemy import select, delete, insert, update, or_, func
 
 from app.base import BaseAccessor
 from app.map.dataclasses import (
+    ChangeDC,
     NodeDC,
     NodeConnectionDC,
     NodetypeDC,
@@ -12,10 +16,69 @@ from app.map.dataclasses import (
     NodesDC,
 )
 
-from app.map.models import NodeModel, TypeModel, ConnectionModel
+from app.map.models import NodeModel, TypeModel, ConnectionModel, ChangeModel
 
 
 class MapAccessor(BaseAccessor):
+    @staticmethod
+    def log_change(session, entity: str, entity_id: int, action: str) -> None:
+        session.add(
+            ChangeModel(
+                entity=entity,
+                entity_id=entity_id,
+                action=action,
+                created_time=datetime.datetime.utcnow(),
+            )
+        )
+
+    async def get_change_marker(self) -> int:
+        async with self.app.database.session() as session:
+            marker = await session.scalar(select(func.max(ChangeModel.id)))
+            return marker or 0
+
+    async def get_missing_changes(self, marker: int, window: int) -> list[int]:
+        first = max(1, marker - window + 1)
+        async with self.app.database.session() as session:
+            res = await session.scalars(
+                select(ChangeModel.id).where(
+                    ChangeModel.id >= first, ChangeModel.id <= marker
+                )
+            )
+            present = set(res.all())
+        return [
+            change_id
+            for change_id in range(first, marker + 1)
+            if change_id not in present
+        ]
+
+    async def get_changes(
+        self, after: int, limit: int, missing: list[int] = ()
+    ) -> list[ChangeDC]:
+        condition = ChangeModel.id > after
+        if missing:
+            condition = or_(condition, ChangeModel.id.in_(sorted(missing)))
+        async with self.app.database.session() as session:
+            query = (
+                select(ChangeModel)
+                .where(condition)
+                .order_by(ChangeModel.id)
+                .limit(limit)
+            )
+            res = await session.scalars(query)
+            return [change.to_dc() for change in res.all()]
+
+    async def get_rows_by_ids(
+        self, entity: str, ids: set[int]
+    ) -> dict[int, NodetypeDC | NodeDC | NodeConnectionDC]:
+        model = {"type": TypeModel, "node": NodeModel, "connection": ConnectionModel}[
+            entity
+        ]
+        if not ids:
+            return dict()
+        async with self.app.database.session() as session:
+            res = await session.scalars(select(model).where(model.id.in_(sorted(ids))))
+            return {row.id: row.to_dc() for row in res.all()}
+
     async def createType(
         self, name: str, shortname: str, parent_id: int | None, description: str | None
     ) -> NodetypeDC | None:
@@ -28,6 +91,8 @@ class MapAccessor(BaseAccessor):
                     description=description,
                 )
                 session.add(nodeType)
+                await session.flush()
+                self.log_change(session, "type", nodeType.id, "add")
                 await session.commit()
                 return nodeType.to_dc()
         except sqlalchemy.exc.IntegrityError:
@@ -64,6 +129,8 @@ class MapAccessor(BaseAccessor):
                     edited_time=datetime.datetime.utcnow(),
                 )
                 session.add(node)
+                await session.flush()
+                self.log_change(session, "node", node.id, "add")
                 await session.commit()
                 return node.to_dc()
         except sqlalchemy.exc.IntegrityError:
@@ -84,6 +151,8 @@ class MapAccessor(BaseAccessor):
                     t_weight=t_weight,
                 )
                 session.add(connection)
+                await session.flush()
+                self.log_change(session, "connection", connection.id, "add")
                 await session.commit()
                 return connection.to_dc()
         except sqlalchemy.exc.IntegrityError:
@@ -91,11 +160,100 @@ class MapAccessor(BaseAccessor):
         except sqlalchemy.exc.ProgrammingError:
             return None
 
+    async def import_graph(
+        self, user_id: int, levels: list[list[dict]], conns: list[dict]
+    ) -> tuple[dict[str, NodeDC], list[NodeConnectionDC]] | None:
+        now = datetime.datetime.utcnow()
+        created = dict()
+        connections = list()
+        try:
+            async with self.app.database.session() as session:
+                for level in levels:
+                    res = await session.scalars(
+                        insert(NodeModel).returning(
+                            NodeModel, sort_by_parameter_order=True
+                        ),
+                        [
+                            {
+                                "name": node["name"],
+                                "shortname": node["shortname"],
+                                "parent_id": (
+                                    created[node["parent_ref"]].id
+                                    if node.get("parent_ref")
+                                    else node.get("parent_id")
+                                ),
+                                "description": node.get("description"),
+                                "creator_id": user_id,
+                                "editor_id": user_id,
+                                "type_id": node["type_id"],
+                                "x_cord": node["x"],
+                                "y_cord": node["y"],
+                                "z_cord": node["z"],
+                                "created_time": now,
+                                "edited_time": now,
+                            }
+                            for node in level
+                        ],
+                    )
+                    for node, row in zip(level, res.all()):
+                        created[node["ref"]] = row.to_dc()
+                if conns:
+                    res = await session.scalars(
+                        insert(ConnectionModel).returning(
+                            ConnectionModel, sort_by_parameter_order=True
+                        ),
+                        [
+                            {
+                                "node1_id": (
+                                    created[conn["node1_ref"]].id
+                                    if conn.get("node1_ref")
+                                    else conn["node1_id"]
+                                ),
+                                "node2_id": (
+                                    created[conn["node2_ref"]].id
+                                    if conn.get("node2_ref")
+                                    else conn["node2_id"]
+                                ),
+                                "distance": conn["distance"],
+                                "time": conn["time"],
+                                "t_weight": conn["t_weight"],
+                            }
+                            for conn in conns
+                        ],
+                    )
+                    connections = [row.to_dc() for row in res.all()]
+                changes = [
+                    {
+                        "entity": "node",
+                        "entity_id": node.id,
+                        "action": "add",
+                        "created_time": now,
+                    }
+                    for node in created.values()
+                ] + [
+                    {
+                        "entity": "connection",
+                        "entity_id": conn.id,
+                        "action": "add",
+                        "created_time": now,
+                    }
+                    for conn in connections
+                ]
+                if changes:
+                    await session.execute(insert(ChangeModel), changes)
+                await session.commit()
+                return created, connections
+        except sqlalchemy.exc.IntegrityError:
+            return None
+        except sqlalchemy.exc.ProgrammingError:
+            return None
+
     async def deleteNode(self, id: int) -> False | True:
         try:
             async with self.app.database.session() as session:
                 query = delete(NodeModel).where(NodeModel.id == id)
                 await session.execute(query)
+                self.log_change(session, "node", id, "delete")
                 await session.commit()
                 return True
         except sqlalchemy.exc.IntegrityError:
@@ -108,6 +266,7 @@ class MapAccessor(BaseAccessor):
             async with self.app.database.session() as session:
                 query = delete(TypeModel).where(TypeModel.id == id)
                 await session.execute(query)
+                self.log_change(session, "type", id, "delete")
                 await session.commit()
                 return True
         except sqlalchemy.exc.IntegrityError:
@@ -120,6 +279,7 @@ class MapAccessor(BaseAccessor):
             async with self.app.database.session() as session:
                 query = delete(ConnectionModel).where(ConnectionModel.id == id)
                 await session.execute(query)
+                self.log_change(session, "connection", id, "delete")
                 await session.commit()
                 return True
         except sqlalchemy.exc.IntegrityError:
@@ -209,6 +369,7 @@ class MapAccessor(BaseAccessor):
                     )
                 )
                 await session.execute(query)
+                self.log_change(session, "node", id, "change")
                 await session.commit()
                 node = await self.get_node_by_id(id)
                 return node
@@ -232,6 +393,7 @@ class MapAccessor(BaseAccessor):
                     )
                 )
                 await session.execute(query)
+                self.log_change(session, "type", id, "change")
                 await session.commit()
                 nodeType = await self.get_type_by_id(id)
                 return nodeType
@@ -251,6 +413,7 @@ class MapAccessor(BaseAccessor):
                     .values(distance=distance, time=time, t_weight=t_weight)
                 )
                 await session.execute(query)
+                self.log_change(session, "connection", id, "change")
                 await session.commit()
                 conn = await self.get_connection_by_id(id)
                 return conn
@@ -259,10 +422,14 @@ class MapAccessor(BaseAccessor):
         except sqlalchemy.exc.ProgrammingError:
             return None
 
-    async def get_all_nodes(self, page: int | None, limit: int | None) -> NodesDC | None:
+    async def get_all_nodes(
+        self, page: int | None, limit: int | None, after: int | None = None
+    ) -> NodesDC | None:
         try:
             async with self.app.database.session() as session:
-                if page and limit:
+                if after is not None and limit:
+                    query = select(NodeModel).where(NodeModel.id > after).limit(limit).order_by(NodeModel.id)
+                elif page and limit:
                     query = select(NodeModel).limit(limit).offset((page - 1) * limit).order_by(NodeModel.id)
                 else:
                     query = select(NodeModel).order_by(NodeModel.id)
@@ -294,10 +461,14 @@ class MapAccessor(BaseAccessor):
         except sqlalchemy.exc.IntegrityError:
             return None
 
-    async def get_all_types(self, page: int | None, limit: int | None) -> TypesDC | None:
+    async def get_all_types(
+        self, page: int | None, limit: int | None, after: int | None = None
+    ) -> TypesDC | None:
         try:
             async with self.app.database.session() as session:
-                if page and limit:
+                if after is not None and limit:
+                    query = select(TypeModel).where(TypeModel.id > after).limit(limit).order_by(TypeModel.id)
+                elif page and limit:
                     query = select(TypeModel).limit(limit).offset((page - 1) * limit).order_by(TypeModel.id)
                 else:
                     query = select(TypeModel).order_by(TypeModel.id)
@@ -322,11 +493,18 @@ class MapAccessor(BaseAccessor):
             return None
 
     async def get_all_connections(
-        self, page: int | None, limit: int | None
+        self, page: int | None, limit: int | None, after: int | None = None
     ) -> ConnectionsDC | None:
         try:
             async with self.app.database.session() as session:
-                if page and limit:
+                if after is not None and limit:
+                    query = (
+                        select(ConnectionModel)
+                        .where(ConnectionModel.id > after)
+                        .limit(limit)
+                        .order_by(ConnectionModel.id)
+                    )
+                elif page and limit:
                     query = (
                         select(ConnectionModel)
                         .limit(limit)
@@ -448,3 +626,97 @@ class MapAccessor(BaseAccessor):
                     return None
         except sqlalchemy.exc.IntegrityError:
             return None
+
+    async def stream_types(self, chunk: int = 1000) -> AsyncIterator[Row]:
+        async with self.app.database.session() as session:
+            query = (
+                select(TypeModel.id, TypeModel.parent_id, TypeModel.name)
+                .order_by(TypeModel.id)
+                .execution_options(yield_per=chunk)
+            )
+            result = await session.stream(query)
+            async for row in result:
+                yield row
+
+    async def stream_nodes(self, chunk: int = 5000) -> AsyncIterator[Row]:
+        async with self.app.database.session() as session:
+            query = (
+                select(
+                    NodeModel.id,
+                    NodeModel.parent_id,
+                    NodeModel.type_id,
+                    NodeModel.name,
+                    NodeModel.x_cord,
+                    NodeModel.y_cord,
+                    NodeModel.z_cord,
+                )
+                .order_by(NodeModel.id)
+                .execution_options(yield_per=chunk)
+            )
+            result = await session.stream(query)
+            async for row in result:
+                yield row
+
+    async def stream_connections(self, chunk: int = 10000) -> AsyncIterator[Row]:
+        async with self.app.database.session() as session:
+            query = (
+                select(
+                    ConnectionModel.id,
+                    ConnectionModel.node1_id,
+                    ConnectionModel.node2_id,
+                    ConnectionModel.distance,
+                    ConnectionModel.time,
+                    ConnectionModel.t_weight,
+                )
+                .order_by(ConnectionModel.id)
+                .execution_options(yield_per=chunk)
+            )
+            result = await session.stream(query)
+            async for row in result:
+                yield row
+
+    async def export_rows(
+        self, entity: str, after: int = 0, chunk: int = 1000
+    ) -> AsyncIterator[Row]:
+        columns = {
+            "type": (
+                TypeModel.id,
+                TypeModel.parent_id,
+                TypeModel.name,
+                TypeModel.shortname,
+                TypeModel.description,
+            ),
+            "node": (
+                NodeModel.id,
+                NodeModel.parent_id,
+                NodeModel.type_id,
+                NodeModel.name,
+                NodeModel.shortname,
+                NodeModel.description,
+                NodeModel.x_cord,
+                NodeModel.y_cord,
+                NodeModel.z_cord,
+            ),
+            "connection": (
+                ConnectionModel.id,
+                ConnectionModel.node1_id,
+                ConnectionModel.node2_id,
+                ConnectionModel.distance,
+                ConnectionModel.time,
+                ConnectionModel.t_weight,
+            ),
+        }[entity]
+        while True:
+            async with self.app.database.session() as session:
+                res = await session.execute(
+                    select(*columns)
+                    .where(columns[0] > after)
+                    .order_by(columns[0])
+                    .limit(chunk)
+                )
+                rows = res.all()
+            for row in rows:
+                yield row
+            if len(rows) < chunk:
+                return
+            after = rows[-1].id
@@ -9,7 +9,7 @@ if TYPE_CHECKING:
 
 
 class Update_Handler(BaseAccessor):
-    def __int__(self, app: "Application", *args, **kwargs):
+    def __init__(self, app: "Application", *args, **kwargs):
         super().__init__(app, *args, **kwargs)
         self.updater: Optional[Handler] = None
 
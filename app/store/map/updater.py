@@ -1,6 +1,7 @@
 import typing
 import asyncio
 from asyncio import Task
+from logging import getLogger
 
 
 if typing.TYPE_CHECKING:
@@ -11,7 +12,8 @@ class Handler:
     def __init__(self, app: "Application"):
         self.app = app
         self.is_running = False
-        self.handle_task: Task | None
+        self.handle_task: Task | None = None
+        self.logger = getLogger("updater")
 
     async def start(self):
         print("manager init")
@@ -20,7 +22,39 @@ class Handler:
 
     async def stop(self):
         self.is_running = False
-        self.handle_task.cancel()
+        if self.handle_task is not None:
+            self.handle_task.cancel()
 
     async def handle_update(self):
-        pass
+        while self.is_running:
+            try:
+                while await self.poll():
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error("change feed poll failed", exc_info=e)
+            await asyncio.sleep(self.app.config.map.change_poll_interval)
+
+    async def poll(self) -> bool:
+        navigator = self.app.store.map
+        if not navigator.working or navigator.shared is not None:
+            return False
+        changes = await self.app.store.mapAPI.get_changes(
+            navigator.marker,
+            self.app.config.map.change_batch_size,
+            navigator.missing_changes(),
+        )
+        if not changes:
+            return False
+        rows = dict()
+        for entity in ("type", "node", "connection"):
+            rows[entity] = await self.app.store.mapAPI.get_rows_by_ids(
+                entity,
+                {change.entity_id for change in changes if change.entity == entity},
+            )
+        applied = await navigator.mutate(navigator.apply_changes, changes, rows)
+        self.logger.info(
+            "applied %d of %d changes up to %d", applied, len(changes), navigator.marker
+        )
+        return len(changes) == self.app.config.map.change_batch_size
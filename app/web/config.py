@@ -1,5 +1,5 @@
 import typing
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 import yaml
 
@@ -21,10 +21,39 @@ class DatabaseConfig:
     database: str
 
 
+@dataclass
+class MapConfig:
+    route_cache_size: int = 4096
+    route_cache_ttl: float = 3600.0
+    navigate_fallback: str = "unavailable"
+    navigate_batch_limit: int = 10000
+    import_limit: int = 50000
+    export_chunk: int = 1000
+    nearest_limit: int = 50
+    route_executor: str = "inline"
+    route_workers: int = 4
+    route_queue_size: int = 64
+    route_timeout: float = 10.0
+    snapshot_path: str | None = None
+    graph_mode: str = "private"
+    shared_graph_poll: float = 1.0
+    change_poll_interval: float = 1.0
+    change_batch_size: int = 500
+    change_gap_window: int = 1000
+    change_gap_timeout: float = 300.0
+    autostart: bool = True
+    ready_wait: float = 5.0
+    route_planner: str = "flat"
+    route_engine: str = "astar"
+    route_profiles: dict = field(default_factory=dict)
+    spatial_cell: float = 10.0
+
+
 @dataclass
 class Config:
     database: DatabaseConfig | None = None
     session: SessionConfig | None = None
+    map: MapConfig = field(default_factory=MapConfig)
 
 
 def setup_config(app: "Application", config_path: str):
@@ -35,4 +64,5 @@ def setup_config(app: "Application", config_path: str):
             key=raw_config["session"]["key"],
         ),
         database=DatabaseConfig(**raw_config["database"]),
+        map=MapConfig(**raw_config.get("map", {})),
     )
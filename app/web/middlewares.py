@@ -33,7 +33,8 @@ HTTP_ERROR_CODES = {
     405: "not_implemented",
     409: "conflict",
     500: "internal_server_error",
-    503:"service_unavailable "
+    503:"service_unavailable ",
+    504: "gateway_timeout",
 }
 
 
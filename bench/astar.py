@@ -0,0 +1,127 @@
+import argparse
+import asyncio
+import heapq
+import math
+import time
+
+from bench.campus import Campus, campus_map
+from app.map_module.cost import SHORTEST
+from app.map_module.mapper import BUILDING_BLOCKED
+
+
+class LegacyRouteNode:
+    def __init__(self, target_distance, start_distance, node, previous):
+        self.target_distance = target_distance
+        self.start_distance = start_distance
+        self.current = node
+        self.previous = previous
+
+    def __lt__(self, other):
+        if (
+            self.target_distance + self.start_distance
+            != other.target_distance + self.start_distance
+        ):
+            return (
+                self.target_distance + self.start_distance
+                < other.target_distance + self.start_distance
+            )
+        return self.current < other.current
+
+
+def legacy_search(graph, start_node: int, target_node: int, blocked: bytes) -> int:
+    start = graph.index[start_node]
+    target = graph.index[target_node]
+
+    def heuristic(idx):
+        return math.sqrt(
+            (graph.x[target] - graph.x[idx]) ** 2
+            + (graph.y[target] - graph.y[idx]) ** 2
+            + (graph.z[target] - graph.z[idx]) ** 2
+        )
+
+    to_visit = [LegacyRouteNode(heuristic(start), 0, start, -1)]
+    visited = set()
+    expanded = 0
+    while to_visit:
+        current_node = heapq.heappop(to_visit)
+        if current_node.current == target:
+            return expanded
+        expanded += 1
+        visited.add(current_node.current)
+        for pos in range(
+            graph.offsets[current_node.current], graph.offsets[current_node.current + 1]
+        ):
+            neighbor = graph.adj[pos]
+            if neighbor < 0 or neighbor in visited or blocked[graph.kind[neighbor]]:
+                continue
+            distance = current_node.start_distance + graph.adj_distance[pos]
+            if elem := next(
+                (element for element in to_visit if element.current == neighbor), None
+            ):
+                if distance < elem.start_distance:
+                    elem.start_distance = distance
+                    elem.previous = current_node
+            else:
+                heapq.heappush(
+                    to_visit,
+                    LegacyRouteNode(
+                        heuristic(neighbor), distance, neighbor, current_node
+                    ),
+                )
+    return expanded
+
+
+def report(name: str, seconds: float, expanded: int, queries: int) -> None:
+    print(
+        f"{name:<8} {seconds / queries * 1000:>10.3f} ms/query "
+        f"{expanded / queries:>10.1f} expanded/query"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="A* open-set microbenchmark")
+    parser.add_argument("--buildings", type=int, default=4)
+    parser.add_argument("--floors", type=int, default=5)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    campus = Campus(args.buildings, args.floors, args.rooms)
+    navigator = campus_map(campus)
+    asyncio.run(navigator.start())
+    pairs = campus.pairs(args.queries, same_building=True)
+    print(
+        f"{len(campus.nodes)} nodes, {len(campus.conns)} connections, "
+        f"{len(pairs)} intra-building queries"
+    )
+
+    started = time.perf_counter()
+    expanded = sum(
+        legacy_search(navigator.graph, start, target, BUILDING_BLOCKED)
+        for start, target in pairs
+    )
+    report("before", time.perf_counter() - started, expanded, len(pairs))
+
+    started = time.perf_counter()
+    expanded = 0
+    for start, target in pairs:
+        expanded += navigator._Map__astar(start, target, BUILDING_BLOCKED, SHORTEST)[
+            "expanded"
+        ]
+    report("after", time.perf_counter() - started, expanded, len(pairs))
+
+    started = time.perf_counter()
+    forward = backward = 0
+    for start, target in pairs:
+        result = navigator._Map__bidirectional(start, target, BUILDING_BLOCKED, SHORTEST)
+        forward += result["forward"]
+        backward += result["backward"]
+    report("bidirect", time.perf_counter() - started, forward + backward, len(pairs))
+    print(
+        f"{'':<8} {forward / len(pairs):>10.1f} forward {backward / len(pairs):>10.1f} "
+        f"backward expanded/query"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+import random
+import types
+from collections import namedtuple
+
+from app.map_module.dataclasses import KEY_TYPES
+from app.map_module.mapper import Map
+from app.web.config import Config, MapConfig
+
+
+TypeRow = namedtuple("TypeRow", "id parent_id name")
+NodeRow = namedtuple("NodeRow", "id parent_id type_id name x_cord y_cord z_cord")
+ConnRow = namedtuple("ConnRow", "id node1_id node2_id distance time t_weight")
+
+TYPES = [
+    TypeRow(1, None, KEY_TYPES.STREET),
+    TypeRow(2, None, KEY_TYPES.KORPUS),
+    TypeRow(3, None, "Этаж"),
+    TypeRow(4, None, "Коридор"),
+    TypeRow(5, 4, "Аудитория"),
+    TypeRow(6, 4, "Туалет"),
+    TypeRow(7, None, KEY_TYPES.DOOR),
+    TypeRow(8, None, KEY_TYPES.ELEVATOR),
+    TypeRow(9, None, "Лестница"),
+]
+FLOOR_HEIGHT = 4.0
+WALKING_SPEED = 1.4
+
+
+class Campus:
+    def __init__(
+        self,
+        buildings: int = 6,
+        floors: int = 5,
+        rooms: int = 40,
+        seed: int = 1,
+        staggered: bool = False,
+    ):
+        self.random = random.Random(seed)
+        self.staggered = staggered
+        self.types = list(TYPES)
+        self.nodes = list()
+        self.conns = list()
+        self.rooms = list()
+        self.street = list()
+        self.buildings = dict()
+        side = max(2, int(buildings**0.5 + 0.999))
+        spacing = rooms * 3.0 + 40.0
+        grid = dict()
+        for row in range(side + 1):
+            for col in range(side + 1):
+                grid[row, col] = self.node(None, 1, col * spacing, row * spacing, 0.0)
+                if col:
+                    self.conn(grid[row, col - 1], grid[row, col])
+                if row:
+                    self.conn(grid[row - 1, col], grid[row, col])
+        self.street = list(grid.values())
+        for number in range(buildings):
+            row, col = divmod(number, side)
+            self.building(
+                number,
+                col * spacing + 20.0,
+                row * spacing + 20.0,
+                floors,
+                rooms,
+                (grid[row, col], grid[row, col + 1]),
+            )
+
+    def node(self, parent_id, type_id, x, y, z, name=None) -> int:
+        node_id = len(self.nodes) + 1
+        self.nodes.append(
+            NodeRow(node_id, parent_id, type_id, name or f"node-{node_id}", x, y, z)
+        )
+        return node_id
+
+    def conn(self, node1_id: int, node2_id: int, wait: float = 0.0) -> int:
+        first = self.nodes[node1_id - 1]
+        second = self.nodes[node2_id - 1]
+        distance = (
+            (first.x_cord - second.x_cord) ** 2
+            + (first.y_cord - second.y_cord) ** 2
+            + (first.z_cord - second.z_cord) ** 2
+        ) ** 0.5
+        conn_id = len(self.conns) + 1
+        self.conns.append(
+            ConnRow(
+                conn_id,
+                node1_id,
+                node2_id,
+                distance,
+                distance / WALKING_SPEED + wait,
+                distance * self.random.uniform(1.0, 1.5) + wait,
+            )
+        )
+        return conn_id
+
+    def building(self, number, x, y, floors, rooms, street):
+        korpus = self.node(None, 2, x, y, 0.0, f"korpus-{number}")
+        self.buildings[korpus] = list()
+        stairs = [None, None]
+        elevator = None
+        for floor in range(floors):
+            z = floor * FLOOR_HEIGHT
+            floor_id = self.node(korpus, 3, x, y, z, f"korpus-{number}-floor-{floor}")
+            corridor = list()
+            for position in range(rooms):
+                corridor.append(self.node(floor_id, 4, x + position * 3.0, y, z))
+                if position:
+                    self.conn(corridor[-2], corridor[-1])
+                room_type = 6 if position % 10 == 5 else 5
+                room = self.node(floor_id, room_type, x + position * 3.0, y + 3.0, z)
+                self.conn(corridor[-1], room)
+                self.rooms.append(room)
+                self.buildings[korpus].append(room)
+            for end in (0, 1) if self.staggered else (0,):
+                corner = corridor[-1] if end else corridor[0]
+                landing = self.node(
+                    floor_id,
+                    9,
+                    self.nodes[corner - 1].x_cord + (2.0 if end else -2.0),
+                    y,
+                    z,
+                )
+                self.conn(landing, corner)
+                if stairs[end] and (not self.staggered or floor % 2 != end):
+                    self.conn(stairs[end], landing)
+                stairs[end] = landing
+            lift = self.node(floor_id, 8, x + rooms * 1.5, y - 2.0, z)
+            self.conn(lift, corridor[rooms // 2])
+            if elevator:
+                self.conn(elevator, lift, wait=30.0)
+            elevator = lift
+            if floor == 0:
+                for corner, street_node in zip((corridor[0], corridor[-1]), street):
+                    door = self.node(
+                        floor_id, 7, self.nodes[corner - 1].x_cord, y - 3.0, z
+                    )
+                    self.conn(corner, door)
+                    self.conn(door, street_node)
+
+    def pairs(self, count: int, same_building: bool | None = None) -> list:
+        result = list()
+        buildings = list(self.buildings.values())
+        while len(result) < count:
+            if same_building:
+                rooms = self.random.choice(buildings)
+                result.append((self.random.choice(rooms), self.random.choice(rooms)))
+            elif same_building is False:
+                first, second = self.random.sample(buildings, 2)
+                result.append((self.random.choice(first), self.random.choice(second)))
+            else:
+                result.append(
+                    (self.random.choice(self.rooms), self.random.choice(self.rooms))
+                )
+        return result
+
+
+class CampusAccessor:
+    def __init__(self, campus: Campus):
+        self.campus = campus
+
+    async def get_change_marker(self) -> int:
+        return len(self.campus.nodes) + len(self.campus.conns)
+
+    async def get_missing_changes(self, marker: int, window: int) -> list[int]:
+        return []
+
+    async def get_changes(self, after: int, limit: int, missing: list[int] = ()) -> list:
+        return []
+
+    async def stream_types(self, chunk: int = 1000):
+        for row in self.campus.types:
+            yield row
+
+    async def stream_nodes(self, chunk: int = 5000):
+        for row in self.campus.nodes:
+            yield row
+
+    async def stream_connections(self, chunk: int = 10000):
+        for row in self.campus.conns:
+            yield row
+
+
+def campus_map(campus: Campus, config: MapConfig | None = None) -> Map:
+    app = types.SimpleNamespace(
+        config=Config(map=config or MapConfig()),
+        store=types.SimpleNamespace(mapAPI=CampusAccessor(campus)),
+    )
+    app.store.map = Map(app)
+    return app.store.map
@@ -0,0 +1,68 @@
+import argparse
+import asyncio
+import time
+
+from app.map_module.cost import FASTEST, SHORTEST
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+async def run(campus: Campus, engine: str, pairs: list, model) -> dict:
+    navigator = campus_map(campus, MapConfig(route_cache_size=0, route_engine=engine))
+    started = time.perf_counter()
+    await navigator.start()
+    boot = time.perf_counter() - started
+
+    routes = list()
+    started = time.perf_counter()
+    for start_id, target_id in pairs:
+        routes.append(await navigator.navigate_main(start_id, target_id, model))
+    per_query = (time.perf_counter() - started) / len(pairs)
+
+    conn = campus.conns[len(campus.conns) // 2]
+    navigator.change_conn(conn._replace(distance=conn.distance * 2))
+    started = time.perf_counter()
+    await navigator.navigate_main(*pairs[0], model)
+    after_change = time.perf_counter() - started
+    return {
+        "boot": boot,
+        "per_query": per_query,
+        "after_change": after_change,
+        "routes": [[node.id for node in route] if route else None for route in routes],
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="A* vs contraction hierarchy routing")
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    for buildings, floors in ((4, 3), (16, 6), (36, 12)):
+        campus = Campus(buildings, floors, args.rooms)
+        print(f"{buildings} buildings x {floors} floors, {len(campus.nodes)} nodes")
+        for name, same_building in (("same building", True), ("cross building", False)):
+            pairs = campus.pairs(args.queries, same_building)
+            for model in (SHORTEST, FASTEST):
+                results = {
+                    engine: await run(campus, engine, pairs, model)
+                    for engine in ("astar", "contraction")
+                }
+                mismatches = sum(
+                    first != second
+                    for first, second in zip(
+                        results["astar"]["routes"], results["contraction"]["routes"]
+                    )
+                )
+                for engine, result in results.items():
+                    print(
+                        f"  {name:<14} {model.name:<8} {engine:<11} "
+                        f"boot {result['boot']:>7.2f} s   "
+                        f"{result['per_query'] * 1000:>8.3f} ms/query   "
+                        f"after change_conn {result['after_change'] * 1000:>8.1f} ms"
+                    )
+                print(f"  {'':<14} {model.name:<8} mismatching routes: {mismatches}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
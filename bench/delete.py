@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import gc
+import time
+
+from app.map_module.mapper import Map
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+def legacy_delete_node(navigator, node_id: int) -> None:
+    # delete_node before the forced collections were dropped: children first,
+    # every connection and node removed on its own, gc.collect() after each
+    graph = navigator.graph
+    with navigator.lock:
+        for child in list(navigator.nodes[node_id].childrens):
+            legacy_delete_node(navigator, child)
+        for slot in list(graph.incident(graph.index[node_id])):
+            conn_id = graph.edge_ids[slot]
+            navigator.delete_conn(conn_id, *graph.edge_nodes(conn_id))
+            gc.collect()
+        navigator.delete_node(node_id)
+        gc.collect()
+    return None
+
+
+async def deleted(campus: Campus, delete) -> tuple[float, int, int]:
+    navigator = campus_map(campus, MapConfig())
+    await navigator.start()
+    for start_id, target_id in campus.pairs(50, same_building=False):
+        await navigator.navigate_main(start_id, target_id)
+    nodes = len(navigator.nodes)
+    conns = len(navigator.graph.edge_index)
+    started = time.perf_counter()
+    delete(navigator, next(iter(campus.buildings)))
+    seconds = time.perf_counter() - started
+    return (
+        seconds,
+        nodes - len(navigator.nodes),
+        conns - len(navigator.graph.edge_index),
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Deleting a building with thousands of rooms from a loaded map"
+    )
+    parser.add_argument("--buildings", type=int, default=4)
+    parser.add_argument("--floors", type=int, default=4)
+    parser.add_argument("--rooms", type=int, default=250)
+    args = parser.parse_args()
+
+    campus = Campus(args.buildings, args.floors, args.rooms)
+    seconds, nodes, conns = await deleted(campus, Map.delete_node)
+    print(f"delete_node   {seconds:>9.3f} s   {nodes} nodes, {conns} connections")
+    seconds, nodes, conns = await deleted(campus, legacy_delete_node)
+    print(
+        f"with gc       {seconds:>9.3f} s   {nodes} nodes, {conns} connections, "
+        f"gc.collect() after each"
+    )
+
+    navigator = campus_map(campus, MapConfig())
+    await navigator.start()
+    started = time.perf_counter()
+    navigator.delete_type(6)
+    print(
+        f"delete_type   {time.perf_counter() - started:>9.3f} s   cascading to its rooms"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import time
+
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+async def run(campus: Campus, planner: str, pairs: list) -> tuple[float, float]:
+    navigator = campus_map(campus, MapConfig(route_cache_size=0, route_planner=planner))
+    await navigator.start()
+    started = time.perf_counter()
+    await navigator.navigate_main(*pairs[0])
+    warmup = time.perf_counter() - started
+    started = time.perf_counter()
+    for start_id, target_id in pairs:
+        await navigator.navigate_main(start_id, target_id)
+    return warmup, (time.perf_counter() - started) / len(pairs)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Flat vs floor-hierarchical routing")
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    for buildings, floors in ((4, 3), (4, 12), (16, 12), (36, 12)):
+        campus = Campus(buildings, floors, args.rooms)
+        pairs = campus.pairs(args.queries)
+        print(f"{buildings} buildings x {floors} floors, {len(campus.nodes)} nodes")
+        for planner in ("flat", "hierarchical"):
+            warmup, per_query = await run(campus, planner, pairs)
+            print(
+                f"  {planner:<13} {per_query * 1000:>8.3f} ms/query   "
+                f"first query {warmup * 1000:>8.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,54 @@
+import argparse
+import asyncio
+import time
+
+from app.map_module.metrics import LatencyMeter
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+async def run(navigator, pairs, db_rtt: float | None) -> LatencyMeter:
+    meter = LatencyMeter(len(pairs))
+    for start_id, target_id in pairs:
+        started = time.perf_counter()
+        if db_rtt is None:
+            found = start_id in navigator.nodes and target_id in navigator.nodes
+        else:
+            await asyncio.sleep(db_rtt)
+            await asyncio.sleep(db_rtt)
+            found = True
+        if found:
+            await navigator.navigate_main(start_id, target_id)
+        meter.add(time.perf_counter() - started)
+    return meter
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="/map/navigate handler latency")
+    parser.add_argument("--buildings", type=int, default=6)
+    parser.add_argument("--floors", type=int, default=5)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--popular", type=int, default=300)
+    parser.add_argument(
+        "--db-rtt-ms",
+        type=float,
+        default=1.0,
+        help="simulated round trip of one get_node_by_id query",
+    )
+    args = parser.parse_args()
+
+    campus = Campus(args.buildings, args.floors, args.rooms)
+    popular = campus.pairs(args.popular)
+    pairs = [campus.random.choice(popular) for _ in range(args.queries)]
+    for name, db_rtt in (("before", args.db_rtt_ms / 1000), ("after", None)):
+        navigator = campus_map(campus, MapConfig())
+        await navigator.start()
+        stats = (await run(navigator, pairs, db_rtt)).stats()
+        print(
+            f"{name:<8} p50 {stats['p50_ms']:>8.3f} ms   p99 {stats['p99_ms']:>8.3f} ms"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
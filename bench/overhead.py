@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import time
+
+from app.map_module.cost import SHORTEST
+from app.map_module.dataclasses import Lift_Weight
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+def report(name: str, seconds: float, calls: int) -> None:
+    print(f"{name:<28} {seconds / calls * 1e6:>10.2f} us/call")
+
+
+async def legacy_changed(navigator, *node_ids: int, weights_only: bool = False) -> None:
+    navigator._Map__changed(*node_ids, weights_only=weights_only)
+
+
+async def legacy_change_conn(navigator, conn) -> None:
+    # change_conn before the core went synchronous: a coroutine awaiting the
+    # coroutine invalidation helper under the map lock
+    with navigator.lock:
+        navigator.graph.set_weights(conn.id, conn.distance, conn.time, conn.t_weight)
+        await legacy_changed(navigator, conn.node1_id, conn.node2_id, weights_only=True)
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Map load time and per-call cost of the sync core and async facade"
+    )
+    parser.add_argument("--buildings", type=int, default=6)
+    parser.add_argument("--floors", type=int, default=5)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--executor", default="inline")
+    args = parser.parse_args()
+
+    campus = Campus(args.buildings, args.floors, args.rooms)
+    navigator = campus_map(
+        campus, MapConfig(route_cache_size=0, route_executor=args.executor)
+    )
+    await navigator.start()
+    stats = navigator.load_stats
+    print(
+        f"{'load':<28} {stats['seconds']:>10.3f} s        "
+        f"{stats['nodes']} nodes, {stats['connections']} connections"
+    )
+    print(f"best of {args.repeat} rounds after a warm-up, {args.executor} executor")
+
+    # neighbouring rooms: the search is short, so the facade cost is not
+    # buried in the noise of long routes
+    pairs = list(zip(campus.rooms, campus.rooms[1:]))[: args.queries]
+    for start_id, target_id in pairs:
+        navigator.route_ids(start_id, target_id, SHORTEST, Lift_Weight.AVOID)
+    core, facade = list(), list()
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        for start_id, target_id in pairs:
+            navigator.route_ids(start_id, target_id, SHORTEST, Lift_Weight.AVOID)
+        core.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for start_id, target_id in pairs:
+            await navigator.navigate_main(start_id, target_id)
+        facade.append(time.perf_counter() - started)
+    report("route_ids", min(core), len(pairs))
+    report("navigate_main", min(facade), len(pairs))
+    report("  facade overhead", min(facade) - min(core), len(pairs))
+
+    conns = [campus.conns[i % len(campus.conns)] for i in range(args.queries)]
+    core, facade, legacy = list(), list(), list()
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        for conn in conns:
+            navigator.change_conn(conn)
+        core.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for conn in conns:
+            await navigator.mutate(navigator.change_conn, conn)
+        facade.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        for conn in conns:
+            await legacy_change_conn(navigator, conn)
+        legacy.append(time.perf_counter() - started)
+    report("change_conn", min(core), len(conns))
+    report("mutate change_conn", min(facade), len(conns))
+    report("  facade overhead", min(facade) - min(core), len(conns))
+    report("async core change_conn", min(legacy), len(conns))
+    report("  async core overhead", min(legacy) - min(core), len(conns))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
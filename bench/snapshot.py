@@ -0,0 +1,44 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+async def main():
+    parser = argparse.ArgumentParser(
+        description="Map boot time and heap: database, snapshot, shared attach"
+    )
+    parser.add_argument("--buildings", type=int, default=12)
+    parser.add_argument("--floors", type=int, default=8)
+    parser.add_argument("--rooms", type=int, default=120)
+    args = parser.parse_args()
+
+    campus = Campus(args.buildings, args.floors, args.rooms)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "map.snapshot")
+        for name, mode in (
+            ("database", "private"),
+            ("snapshot", "private"),
+            ("attach", "shared"),
+        ):
+            tracemalloc.start()
+            navigator = campus_map(campus, MapConfig(snapshot_path=path, graph_mode=mode))
+            await navigator.start()
+            heap = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            stats = navigator.load_stats
+            print(
+                f"{name:<9} source {stats['source']:<9} {stats['seconds']:>7.3f} s   "
+                f"heap {heap / 2**20:>7.1f} MiB   "
+                f"{stats['nodes']} nodes, {stats['connections']} connections"
+            )
+            del navigator
+        print(f"snapshot  {os.path.getsize(path)} bytes")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
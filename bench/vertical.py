@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import math
+import time
+
+from app.map_module.cost import SHORTEST
+from app.map_module.dataclasses import Lift_Weight
+from app.map_module.mapper import BUILDING_BLOCKED, LIFT_BLOCKED
+from app.web.config import MapConfig
+from bench.campus import Campus, campus_map
+
+
+def report(name: str, seconds: float, queries: int) -> None:
+    print(f"  {name:<17} {seconds / queries * 1000:>8.3f} ms/query")
+
+
+def check(navigator, pairs: list) -> None:
+    for elevator, blocked in (
+        (Lift_Weight.AVOID, BUILDING_BLOCKED),
+        (Lift_Weight.ALLOW, LIFT_BLOCKED),
+    ):
+        for start_id, target_id in pairs:
+            found = navigator._Map__navigate_building_elevator(
+                start_id, target_id, SHORTEST, elevator
+            )
+            if found is None:
+                continue
+            flat = navigator._Map__astar(start_id, target_id, blocked, SHORTEST)
+            assert math.isclose(found["length"], flat["length"], rel_tol=1e-9), (
+                f"{elevator} {start_id} -> {target_id}: "
+                f"transfers {found['length']}, astar {flat['length']}"
+            )
+    return None
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="A* vs floor transfer table routing")
+    parser.add_argument("--buildings", type=int, default=4)
+    parser.add_argument("--rooms", type=int, default=60)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    for staggered in (False, True):
+        for floors in (3, 8, 16):
+            campus = Campus(args.buildings, floors, args.rooms, staggered=staggered)
+            navigator = campus_map(campus, MapConfig(route_cache_size=0))
+            await navigator.start()
+            pairs = campus.pairs(args.queries, same_building=True)
+            stairs = "staggered stairs" if staggered else "one staircase"
+            print(f"{floors} floors, {stairs}, {len(campus.nodes)} nodes")
+            check(navigator, pairs)
+
+            started = time.perf_counter()
+            for start_id, target_id in pairs:
+                navigator._Map__astar(start_id, target_id, BUILDING_BLOCKED, SHORTEST)
+            report("astar", time.perf_counter() - started, len(pairs))
+            for elevator in ("avoid", "allow", "prefer"):
+                started = time.perf_counter()
+                for start_id, target_id in pairs:
+                    await navigator.navigate_main(start_id, target_id, SHORTEST, elevator)
+                report(f"transfers/{elevator}", time.perf_counter() - started, len(pairs))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())